@@ -0,0 +1,78 @@
+import pygame
+
+
+class SpriteAtlas():
+    """ Every image used during a stage, cut out of the sprite sheet once
+
+    Images are pre-rotated for all four directions (indexed by DIR_UP, DIR_RIGHT, DIR_DOWN,
+    DIR_LEFT) and converted to display format when there is a display. Entities share these
+    surfaces and must never draw onto them.
+    """
+
+    # rotation angle for each direction
+    ANGLES = (0, 270, 180, 90)
+
+    def __init__(self, sprites):
+        self.sprites = sprites
+
+        # sheet area => images for all directions
+        self.rotated = {}
+
+        self.bullets = self.rotations((75 * 2, 74 * 2, 3 * 2, 4 * 2))
+
+        # tank explosion frames, bullet explosion uses only the first two of them
+        self.explosion = [self.cut((x * 2, 80 * 2, 32 * 2, 32 * 2)) for x in (0, 32, 64)]
+        self.bullet_explosion = self.explosion[:2]
+
+        self.shield = [self.cut((x * 2, 48 * 2, 16 * 2, 16 * 2)) for x in (0, 16)]
+        self.spawn = [self.cut((x * 2, 48 * 2, 16 * 2, 16 * 2)) for x in (32, 48)]
+
+        # indexed by Bonus.BONUS_*
+        self.bonuses = [self.cut((16 * 2 * n, 32 * 2, 16 * 2, 15 * 2)) for n in range(6)]
+
+        # empty, brick, steel, grass, water (both animation frames) and ice tile
+        self.tiles = [pygame.Surface((8 * 2, 8 * 2))] + [self.cut((x * 2, y * 2, 8 * 2, 8 * 2)) for x, y in (
+            (48, 64), (48, 72), (56, 72), (64, 64), (64, 64), (72, 64)
+        )]
+
+        self.enemy_life = self.cut((81 * 2, 57 * 2, 7 * 2, 7 * 2))
+        self.player_life = self.cut((89 * 2, 56 * 2, 7 * 2, 8 * 2))
+        self.flag = self.cut((64 * 2, 49 * 2, 16 * 2, 15 * 2))
+        self.castle = self.cut((0, 15 * 2, 16 * 2, 16 * 2))
+        self.castle_destroyed = self.cut((16 * 2, 15 * 2, 16 * 2, 16 * 2))
+
+        # both players' tanks
+        for x in (0, 16):
+            self.rotations((x * 2, 0, 13 * 2, 13 * 2))
+
+        # enemies of every type, regular and flashing (bonus carrier) version
+        for y in (0, 16):
+            for x in (32, 48, 64, 80):
+                self.rotations((x * 2, y * 2, 13 * 2, 15 * 2))
+
+    def cut(self, area):
+        """ Copy area of sprite sheet into a standalone surface
+		@return pygame.Surface
+		"""
+        return self.prepare(self.sprites.subsurface(area))
+
+    def prepare(self, surface):
+        """ Convert surface to display format, if there is a display
+		Sheet is a palette image where only one of many white colors is transparent, plain
+		convert() would turn all of them into colorkey, so use per pixel alpha instead
+		"""
+        if pygame.display.get_surface() is None:
+            return surface.copy()
+        return surface.convert_alpha()
+
+    def rotations(self, area):
+        """ Area of sprite sheet rotated for every direction
+		@return tuple Images indexed by direction
+		"""
+        area = tuple(area)
+        images = self.rotated.get(area)
+        if images is None:
+            image = self.sprites.subsurface(area)
+            images = tuple(self.prepare(pygame.transform.rotate(image, angle)) for angle in self.ANGLES)
+            self.rotated[area] = images
+        return images
@@ -0,0 +1,185 @@
+""" Run many headless stages in parallel and collect statistics
+
+Every task is one stage played from start to end by a separate process of a
+multiprocessing pool. Results are printed as one JSON object per line as soon as
+each stage finishes, followed by a summary. For example:
+
+    python batch.py --runs 4 --stages 1-35 --processes 8 > results.jsonl
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from stats import deriveSeed, percentile
+
+# game instance of this worker process, see initWorker()
+worker = None
+
+
+def initWorker():
+    """ Create headless game once per worker process """
+    global worker
+
+    from castle import Castle
+    from game import Game
+    from globals import Globals
+    from timer import Timer
+
+    timer = Timer()
+    globals = Globals(None, timer, None, None, [], [], [], [], [], None, False, {})
+    game = Game(globals, True)
+    globals.castle = Castle(timer, globals.screen, globals.atlas, None)
+    worker = game
+
+
+def taskSeed(seed, run, stage):
+    """ Seed of single task, does not depend on which worker plays it
+	@return int
+	"""
+    return deriveSeed(seed, run, stage)
+
+
+def playStage(task):
+    """ Play one stage in worker process
+	@param tuple task Run index, stage, seed, max ticks, policy, number of players
+	@return dict Stage result
+	"""
+    run, stage, seed, max_ticks, policy, players = task
+    game = worker
+    globals = game.globals
+
+    from inputs import Inputs
+
+    # players either stand still or press random buttons
+    rng = random.Random(seed)
+    moves = [Inputs.UP, Inputs.RIGHT, Inputs.DOWN, Inputs.LEFT, Inputs.NONE]
+    pressed = [Inputs.NONE] * players
+
+    # game prints progress messages, keep them out of results
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        del globals.players[:]
+        game.nr_of_players = players
+        game.stage = stage - 1
+        game.startLevel(seed)
+
+        frame_times = []
+        started = time.perf_counter()
+        outcome = None
+        while game.running and game.ticks < max_ticks:
+            if policy == "random":
+                for n in range(players):
+                    if rng.random() < 0.05:
+                        pressed[n] = rng.choice(moves)
+                inputs = [keys | (Inputs.FIRE if rng.random() < 0.1 else 0) for keys in pressed]
+            else:
+                inputs = pressed
+
+            tick_started = time.perf_counter()
+            game.step(inputs)
+            frame_times.append(time.perf_counter() - tick_started)
+
+            if outcome is None:
+                if not globals.castle.active:
+                    outcome = "castle"
+                elif game.game_over:
+                    outcome = "players"
+                elif not game.active:
+                    outcome = "cleared"
+        wall_time = time.perf_counter() - started
+
+    kills = [0, 0, 0, 0]
+    for player in globals.players:
+        for n in range(4):
+            kills[n] += player.trophies["enemy" + str(n)]
+
+    frame_times.sort()
+    return {
+        "run": run,
+        "stage": stage,
+        "seed": seed,
+        "outcome": outcome or "timeout",
+        "ticks": game.ticks,
+        "game_time": game.ticks * game.TICK / 1000.0,
+        "wall_time": round(wall_time, 4),
+        "kills": kills,
+        "castle_lost": not globals.castle.active,
+        "score": sum(player.score for player in globals.players),
+        "frame_ms": {
+            "mean": round(sum(frame_times) / max(len(frame_times), 1) * 1000, 4),
+            "p50": round(percentile(frame_times, 50) * 1000, 4),
+            "p95": round(percentile(frame_times, 95) * 1000, 4),
+            "p99": round(percentile(frame_times, 99) * 1000, 4),
+            "max": round(frame_times[-1] * 1000, 4) if frame_times else 0.0,
+        },
+    }
+
+
+def parseStages(text):
+    """ Parse stage list like "1-5,10,12"
+	@return list
+	"""
+    stages = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            stages.extend(range(int(first), int(last) + 1))
+        elif part:
+            stages.append(int(part))
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play headless stages in parallel and print statistics as JSON lines")
+    parser.add_argument("--runs", type=int, default=1, help="how many times to play every stage")
+    parser.add_argument("--stages", default="1-35", help="stages to play, e.g. 1-35 or 1,4,18")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0, help="base seed, task seeds are derived from it")
+    parser.add_argument("--max-ticks", type=int, default=30000, help="give up stage after this many ticks")
+    parser.add_argument("--policy", choices=("idle", "random"), default="random", help="how players are controlled")
+    parser.add_argument("--players", type=int, choices=(1, 2), default=1)
+    args = parser.parse_args(argv)
+
+    # workers need paths relative to game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    tasks = [
+        (run, stage, taskSeed(args.seed, run, stage), args.max_ticks, args.policy, args.players)
+        for run in range(args.runs) for stage in parseStages(args.stages)
+    ]
+
+    outcomes = {}
+    kills = [0, 0, 0, 0]
+    frame_means = []
+    started = time.perf_counter()
+    pool = multiprocessing.Pool(args.processes, initializer=initWorker)
+    try:
+        for result in pool.imap_unordered(playStage, tasks):
+            print(json.dumps(result, sort_keys=True))
+            sys.stdout.flush()
+            outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+            kills = [a + b for a, b in zip(kills, result["kills"])]
+            frame_means.append(result["frame_ms"]["mean"])
+    finally:
+        # SDL turns SIGTERM into a quit event, so workers would ignore Pool.terminate()
+        pool.close()
+        pool.join()
+
+    summary = {
+        "summary": True,
+        "stages_played": len(tasks),
+        "outcomes": outcomes,
+        "kills": kills,
+        "mean_frame_ms": round(sum(frame_means) / max(len(frame_means), 1), 4),
+        "wall_time": round(time.perf_counter() - started, 2),
+    }
+    print(json.dumps(summary, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
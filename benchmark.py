@@ -0,0 +1,161 @@
+""" Measure cost of game loop parts in fixed, reproducible scenarios
+
+Every scenario loads a stage headless, keeps a given number of enemies on the map
+through Game.spawnEnemy, plays scripted player inputs from a seeded generator and
+times every part of each tick. Same build and scenario always play out the same
+way, so numbers of two builds can be compared directly:
+
+    python benchmark.py
+    python benchmark.py --scenario fire_all --ticks 5000 --json
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+from castle import Castle
+from game import Game
+from globals import Globals
+from inputs import Inputs
+from stats import percentile
+from timer import Timer
+from tricks import Tricks
+
+# name => stage, number of enemies, Tricks overrides, player inputs. Tricks keep castle
+# standing and players alive, so every scenario lasts for all of its ticks
+SCENARIOS = {
+    "stage1": (1, 4, {"max_active_enemies": 4, "player_bullet_super_power": 0}, "random"),
+    "crowd": (14, 20, {"max_active_enemies": 20}, "random"),
+    "fire_all": (18, 10, {"max_active_enemies": 10, "fire_all": True}, "fire_all"),
+    "super_power": (4, 10, {"max_active_enemies": 10, "player_bullet_super_power": 3}, "fire"),
+}
+
+# measured parts of tick, in order they happen
+PHASES = ("input", "players", "enemies", "bullets", "timers", "draw")
+
+
+def timed(samples, f):
+    """ Wrap f so that time spent in it is added to samples[-1] """
+    def wrapper(*args):
+        started = time.perf_counter()
+        result = f(*args)
+        samples[-1] += time.perf_counter() - started
+        return result
+    return wrapper
+
+
+def runScenario(name, ticks, seed=0, draw=True):
+    """ Play scenario and time it
+	@param string name Key of SCENARIOS
+	@param int ticks Number of ticks to play
+	@param int seed
+	@param boolean draw Whether to render every tick
+	@return dict Phase => list of seconds per tick, including "frame" for whole tick
+	"""
+    stage, enemies, overrides, inputs = SCENARIOS[name]
+
+    tricks = Tricks()
+    for attr, value in overrides.items():
+        setattr(tricks, attr, value)
+
+    timer = Timer()
+    globals = Globals(tricks, timer, None, None, [], [], [], [], [], None, False, {})
+    game = Game(globals, True)
+    globals.castle = Castle(timer, globals.screen, globals.atlas, tricks)
+
+    game.stage = stage - 1
+    game.startLevel(seed)
+
+    # enough enemies for whole run, never finish the stage
+    game.level.max_active_enemies = enemies
+    game.level.enemies_left = [n % 4 for n in range(enemies + ticks)]
+
+    samples = dict((phase, []) for phase in PHASES)
+    game.applyInputs = timed(samples["input"], game.applyInputs)
+    game.updatePlayers = timed(samples["players"], game.updatePlayers)
+    game.updateEnemies = timed(samples["enemies"], game.updateEnemies)
+    game.dropBullets = timed(samples["bullets"], game.dropBullets)
+    globals.bullet_system.step = timed(samples["bullets"], globals.bullet_system.step)
+    game.updateBullets = timed(samples["bullets"], game.updateBullets)
+    timer.update = timed(samples["timers"], timer.update)
+    draw_game = timed(samples["draw"], game.draw)
+    samples["frame"] = []
+
+    rng = random.Random(seed)
+    moves = [Inputs.UP, Inputs.RIGHT, Inputs.DOWN, Inputs.LEFT, Inputs.NONE]
+    move = Inputs.NONE
+
+    for tick in range(ticks):
+        if not game.running:
+            break
+
+        if rng.random() < 0.05:
+            move = rng.choice(moves)
+        keys = move
+        if inputs == "random" and rng.random() < 0.1:
+            keys |= Inputs.FIRE
+        elif inputs == "fire":
+            keys |= Inputs.FIRE
+        elif inputs == "fire_all" and tick % 4 == 0:
+            keys |= Inputs.FIRE_ALL
+
+        for phase in PHASES:
+            samples[phase].append(0.0)
+
+        started = time.perf_counter()
+        if len(globals.enemies) < enemies:
+            game.spawnEnemy()
+        game.step([keys] * len(globals.players))
+        if draw:
+            draw_game()
+        samples["frame"].append(time.perf_counter() - started)
+
+    return samples
+
+
+def summarize(samples):
+    """ Mean, p95 and p99 of every phase in ms
+	@return dict Phase => dict
+	"""
+    summary = {}
+    for phase, values in samples.items():
+        ordered = sorted(values)
+        summary[phase] = {
+            "mean": round(sum(ordered) / max(len(ordered), 1) * 1000, 4),
+            "p95": round(percentile(ordered, 95) * 1000, 4),
+            "p99": round(percentile(ordered, 99) * 1000, 4),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time game loop parts in reproducible headless scenarios")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run, may be repeated (default: all)")
+    parser.add_argument("--ticks", type=int, default=3000, help="ticks per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-draw", action="store_true", help="do not render frames")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = {}
+    for name in args.scenario or sorted(SCENARIOS):
+        samples = runScenario(name, args.ticks, args.seed, not args.no_draw)
+        results[name] = dict(summarize(samples), ticks=len(samples["frame"]))
+
+    if args.json:
+        print(json.dumps(results, sort_keys=True, indent=2))
+        return
+
+    for name, summary in results.items():
+        print("%s (%d ticks)" % (name, summary["ticks"]))
+        print("  %-8s %10s %10s %10s" % ("phase", "mean ms", "p95 ms", "p99 ms"))
+        for phase in PHASES + ("frame",):
+            print("  %-8s %10.4f %10.4f %10.4f" % (phase, summary[phase]["mean"], summary[phase]["p95"], summary[phase]["p99"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-import random
-
 import pygame
 
 
@@ -32,9 +30,9 @@ class Bonus():
 		# blinking state
 		self.visible = True
 
-		self.rect = pygame.Rect(random.randint(0, 416-32), random.randint(0, 416-32), 32, 32)
+		self.rect = pygame.Rect(self.globals.rng.randint(0, 416-32), self.globals.rng.randint(0, 416-32), 32, 32)
 
-		self.bonus = random.choice([
+		self.bonus = self.globals.rng.choice([
 			self.BONUS_GRENADE,
 			self.BONUS_HELMET,
 			self.BONUS_SHOVEL,
@@ -43,12 +41,21 @@ class Bonus():
 			self.BONUS_TIMER
 		])
 
-		self.image = self.globals.sprites.subsurface(16*2*self.bonus, 32*2, 16*2, 15*2)
+		self.image = self.globals.atlas.bonuses[self.bonus]
 
 	def draw(self):
-		""" draw bonus """
+		""" draw bonus
+		@return pygame.Rect Screen area drawn to or None
+		"""
 		if self.visible:
-			self.globals.screen.blit(self.image, self.rect.topleft)
+			return self.globals.screen.blit(self.image, self.rect.topleft)
+
+	def remove(self):
+		""" Take bonus off the map """
+		self.active = False
+		if self in self.globals.bonuses:
+			self.globals.bonuses.remove(self)
+		self.globals.spatial_bonuses.remove(self)
 
 	def toggleVisibility(self):
 		""" Toggle bonus visibility """
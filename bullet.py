@@ -1,7 +1,5 @@
 import pygame
 
-from explosion import Explosion
-
 
 class Bullet():
     # direction constants
@@ -13,122 +11,131 @@ class Bullet():
     (OWNER_PLAYER, OWNER_ENEMY) = range(2)
 
     def __init__(self, level, position, direction, damage=100, speed=5, globals=None):
+        # set in place by reset(), so reused bullets keep their rect
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.reset(level, position, direction, damage, speed, globals)
+
+    def reset(self, level, position, direction, damage=100, speed=5, globals=None):
+        """ (Re)initialize bullet, called also when bullet is reused from pool """
 
         self.globals=globals
         self.level = level
-        self.direction = direction
         self.damage = damage
-        self.owner = None
         self.owner_class = None
 
-        # 1-regular everyday normal bullet
-        # 2-can destroy steel
-        self.power = 1
-
-        self.image = self.globals.sprites.subsurface(75 * 2, 74 * 2, 3 * 2, 4 * 2)
+        self.image = self.globals.atlas.bullets[direction]
 
         # position is player's top left corner, so we'll need to
-        # recalculate a bit. also rotate image itself.
+        # recalculate a bit
         if direction == self.DIR_UP:
-            self.rect = pygame.Rect(position[0] + 11, position[1] - 8, 6, 8)
+            self.rect.update(position[0] + 11, position[1] - 8, 6, 8)
         elif direction == self.DIR_RIGHT:
-            self.image = pygame.transform.rotate(self.image, 270)
-            self.rect = pygame.Rect(position[0] + 26, position[1] + 11, 8, 6)
+            self.rect.update(position[0] + 26, position[1] + 11, 8, 6)
         elif direction == self.DIR_DOWN:
-            self.image = pygame.transform.rotate(self.image, 180)
-            self.rect = pygame.Rect(position[0] + 11, position[1] + 26, 6, 8)
+            self.rect.update(position[0] + 11, position[1] + 26, 6, 8)
         elif direction == self.DIR_LEFT:
-            self.image = pygame.transform.rotate(self.image, 90)
-            self.rect = pygame.Rect(position[0] - 8, position[1] + 11, 8, 6)
+            self.rect.update(position[0] - 8, position[1] + 11, 8, 6)
 
-        self.explosion_images = [
-            self.globals.sprites.subsurface(0, 80 * 2, 32 * 2, 32 * 2),
-            self.globals.sprites.subsurface(32 * 2, 80 * 2, 32 * 2, 32 * 2),
-        ]
+        self.explosion_images = self.globals.atlas.bullet_explosion
 
-        self.speed = speed
+        # position, direction, speed, power and owner live in bullet system, rect
+        # follows position. 1-regular everyday normal bullet, 2-can destroy steel
+        self.system = self.globals.bullet_system
+        self.slot = self.system.add(self, self.rect, direction, speed, 1, self.globals.env_index)
 
         self.state = self.STATE_ACTIVE
 
+    @property
+    def direction(self):
+        return int(self.system.direction[self.slot])
+
+    @property
+    def speed(self):
+        return int(self.system.speed[self.slot])
+
+    @speed.setter
+    def speed(self, speed):
+        self.system.setSpeed(self.slot, speed)
+
+    @property
+    def power(self):
+        return int(self.system.power[self.slot])
+
+    @power.setter
+    def power(self, power):
+        self.system.power[self.slot] = power
+
+    @property
+    def owner(self):
+        owner = int(self.system.owner[self.slot])
+        return None if owner == self.system.NO_OWNER else owner
+
+    @owner.setter
+    def owner(self, owner):
+        self.system.owner[self.slot] = self.system.NO_OWNER if owner is None else owner
+
     def draw(self):
-        """ draw bullet """
+        """ draw bullet
+		@return pygame.Rect Screen area drawn to or None
+		"""
         if self.state == self.STATE_ACTIVE:
-            self.globals.screen.blit(self.image, self.rect.topleft)
+            return self.globals.screen.blit(self.image, self.rect.topleft)
         elif self.state == self.STATE_EXPLODING:
-            self.explosion.draw()
+            return self.explosion.draw()
 
     def update(self):
+        """ Finish explosion or resolve collisions after bullet has moved """
 
         if self.state == self.STATE_EXPLODING:
             if not self.explosion.active:
                 self.destroy()
+                self.globals.explosion_pool.release(self.explosion)
                 del self.explosion
 
         if self.state != self.STATE_ACTIVE:
             return
 
-        """ move bullet """
-        if self.direction == self.DIR_UP:
-            self.rect.topleft = [self.rect.left, self.rect.top - self.speed]
-            if self.rect.top < 0:
-                if self.globals.play_sounds and self.owner == self.OWNER_PLAYER:
-                    self.globals.sounds["steel"].play()
-                self.explode()
-                return
-        elif self.direction == self.DIR_RIGHT:
-            self.rect.topleft = [self.rect.left + self.speed, self.rect.top]
-            if self.rect.left > (416 - self.rect.width):
-                if self.globals.play_sounds and self.owner == self.OWNER_PLAYER:
-                    self.globals.sounds["steel"].play()
-                self.explode()
-                return
-        elif self.direction == self.DIR_DOWN:
-            self.rect.topleft = [self.rect.left, self.rect.top + self.speed]
-            if self.rect.top > (416 - self.rect.height):
-                if self.globals.play_sounds and self.owner == self.OWNER_PLAYER:
-                    self.globals.sounds["steel"].play()
-                self.explode()
-                return
-        elif self.direction == self.DIR_LEFT:
-            self.rect.topleft = [self.rect.left - self.speed, self.rect.top]
-            if self.rect.left < 0:
-                if self.globals.play_sounds and self.owner == self.OWNER_PLAYER:
-                    self.globals.sounds["steel"].play()
-                self.explode()
-                return
+        # bullet has already been moved by BulletSystem.step()
+        if self.system.out_of_bounds[self.slot]:
+            if self.globals.play_sounds and self.owner == self.OWNER_PLAYER:
+                self.globals.sounds["steel"].play()
+            self.explode()
+            return
 
         has_collided = False
 
         # check for collisions with walls. one bullet can destroy several (1 or 2)
         # tiles but explosion remains 1
-        rects = self.level.obstacle_rects
-        collisions = self.rect.collidelistall(rects)
-        if collisions != []:
-            for i in collisions:
-                if self.level.hitTile(rects[i].topleft, self.power, self.owner == self.OWNER_PLAYER):
+        # bullet system may have found already that there are none in the way
+        system = self.system
+        if not system.clear_path[self.slot]:
+            for pos in self.level.sweepObstacles(self.rect, int(system.vx[self.slot]), int(system.vy[self.slot])):
+                if self.level.hitTile(pos, self.power, self.owner == self.OWNER_PLAYER):
                     has_collided = True
         if has_collided:
             self.explode()
             return
 
         # check for collisions with other bullets
-        for bullet in self.globals.bullets:
-            if self.state == self.STATE_ACTIVE and bullet.owner != self.owner and bullet != self and self.rect.colliderect(
-                    bullet.rect):
+        for bullet in self.globals.spatial_bullets.query(self.rect):
+            if self.state == self.STATE_ACTIVE and bullet is not self and self.rect.colliderect(bullet.rect) \
+                    and bullet.owner != self.owner:
                 self.destroy()
                 self.explode()
                 return
 
+        tanks = self.globals.spatial_tanks.query(self.rect)
+
         # check for collisions with players
-        for player in self.globals.players:
-            if player.state == player.STATE_ALIVE and self.rect.colliderect(player.rect):
+        for player in tanks:
+            if player.side == player.SIDE_PLAYER and player.state == player.STATE_ALIVE and self.rect.colliderect(player.rect):
                 if player.bulletImpact(self.owner == self.OWNER_PLAYER, self.damage, self.owner_class):
                     self.destroy()
                     return
 
         # check for collisions with enemies
-        for enemy in self.globals.enemies:
-            if enemy.state == enemy.STATE_ALIVE and self.rect.colliderect(enemy.rect):
+        for enemy in tanks:
+            if enemy.side == enemy.SIDE_ENEMY and enemy.state == enemy.STATE_ALIVE and self.rect.colliderect(enemy.rect):
                 if enemy.bulletImpact(self.owner == self.OWNER_ENEMY, self.damage, self.owner_class):
                     self.destroy()
                     return
@@ -143,7 +150,9 @@ class Bullet():
         """ start bullets's explosion """
         if self.state != self.STATE_REMOVED:
             self.state = self.STATE_EXPLODING
-            self.explosion = Explosion([self.rect.left - 13, self.rect.top - 13], self.globals.timer, self.globals.screen, self.globals.sprites, interval=None, images=self.explosion_images)
+            self.system.deactivate(self.slot)
+            self.explosion = self.globals.explosion_pool.acquire([self.rect.left - 13, self.rect.top - 13], self.globals.timer, self.globals.screen, self.globals.sprites, interval=None, images=self.explosion_images)
 
     def destroy(self):
         self.state = self.STATE_REMOVED
+        self.system.deactivate(self.slot)
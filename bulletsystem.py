@@ -0,0 +1,273 @@
+import numpy as np
+
+from level import Level
+
+
+class BulletSystem():
+    """ Positions and motion of all bullets, stored as NumPy arrays
+
+    Every Bullet owns one slot in the arrays. step() moves and bounds-checks all active
+    bullets at once, Bullet objects only read and write their own slot and keep their
+    rect in sync for collision tests.
+
+    Several games may share one system, each slot is then tagged with index of game its
+    bullet belongs to (see VectorEnvironment) and one step() moves bullets of all of them.
+    """
+
+    # movement per direction (DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT)
+    DX = np.array([0, 1, 0, -1], dtype=np.int32)
+    DY = np.array([-1, 0, 1, 0], dtype=np.int32)
+
+    # bullets leaving this square (battlefield) explode
+    SIZE = 416
+
+    # owner value of bullet without owner
+    NO_OWNER = -1
+
+    # swept areas of at most this many tiles across are looked up in map at once by step(),
+    # paths of faster bullets are always left to Level.sweepObstacles()
+    SWEEP_TILES = 3
+
+    # tile type => whether bullets cannot fly through it, as in Level.updateObstacleRects()
+    OBSTACLES = np.zeros(256, dtype=np.bool_)
+    OBSTACLES[[Level.TILE_BRICK, Level.TILE_STEEL]] = True
+
+    # per-slot arrays: name, type, value of unused slot
+    FIELDS = (
+        ("x", np.int32, 0),
+        ("y", np.int32, 0),
+        ("width", np.int32, 0),
+        ("height", np.int32, 0),
+        ("direction", np.int8, 0),
+        ("speed", np.int32, 0),
+        # movement per tick, zero unless active
+        ("vx", np.int32, 0),
+        ("vy", np.int32, 0),
+        ("power", np.int8, 0),
+        ("owner", np.int8, NO_OWNER),
+        # index of game bullet belongs to, among games sharing the system
+        ("env", np.int16, 0),
+        # moving bullets, only these are advanced by step()
+        ("active", np.bool_, False),
+        # set by step() for bullets which left the battlefield
+        ("out_of_bounds", np.bool_, False),
+        # set by step() for bullets which did not fly over any obstacle tile
+        ("clear_path", np.bool_, False),
+    )
+
+    def __init__(self, capacity=256):
+
+        # slot => Bullet, None for free slots
+        self.objects = []
+
+        # free slots below self.size, reused before growing
+        self.free = []
+
+        # slots in use are all below this
+        self.size = 0
+
+        self.capacity = 0
+        for name, dtype, fill in self.FIELDS:
+            setattr(self, name, np.empty(0, dtype=dtype))
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        """ Resize arrays, keeping existing slots
+		@param int capacity New number of slots
+		@return None
+		"""
+        for name, dtype, fill in self.FIELDS:
+            array = np.full(capacity, fill, dtype=dtype)
+            array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.objects.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def __getstate__(self):
+        """ Pickle only slots below size """
+        state = self.__dict__.copy()
+        state["objects"] = self.objects[:self.size]
+        for name, dtype, fill in self.FIELDS:
+            state[name] = getattr(self, name)[:self.size]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        capacity = self.capacity
+        self.capacity = self.size
+        self.grow(capacity)
+
+    def add(self, bullet, rect, direction, speed, power=1, env=0):
+        """ Give bullet a slot and start moving it
+		@param Bullet bullet
+		@param pygame.Rect rect Bullet's initial area
+		@param int direction
+		@param int speed Pixels per tick
+		@param int power
+		@param int env Index of game bullet belongs to
+		@return int Slot
+		"""
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self.grow(self.capacity * 2)
+            slot = self.size
+            self.size += 1
+
+        self.objects[slot] = bullet
+        self.x[slot] = rect.left
+        self.y[slot] = rect.top
+        self.width[slot] = rect.width
+        self.height[slot] = rect.height
+        self.direction[slot] = direction
+        self.speed[slot] = speed
+        self.power[slot] = power
+        self.owner[slot] = self.NO_OWNER
+        self.env[slot] = env
+        self.active[slot] = True
+        self.vx[slot] = self.DX[direction] * speed
+        self.vy[slot] = self.DY[direction] * speed
+        self.out_of_bounds[slot] = False
+        self.clear_path[slot] = False
+        return slot
+
+    def remove(self, slot):
+        """ Free bullet's slot
+		@param int slot
+		@return None
+		"""
+        if self.objects[slot] is None:
+            return
+        self.objects[slot] = None
+        self.deactivate(slot)
+        self.out_of_bounds[slot] = False
+        if slot == self.size - 1:
+            self.size -= 1
+        else:
+            self.free.append(slot)
+
+    def clear(self, env=None):
+        """ Free all slots
+		@param int env Free only slots of this game, None - of all games
+		@return None
+		"""
+        n = self.size
+        if env is not None:
+            # highest first, so that size shrinks instead of slots piling up in free list
+            for slot in np.flatnonzero(self.env[:n] == env)[::-1].tolist():
+                self.remove(slot)
+            return
+
+        self.objects[:n] = [None] * n
+        self.active[:n] = False
+        self.vx[:n] = 0
+        self.vy[:n] = 0
+        self.out_of_bounds[:n] = False
+        del self.free[:]
+        self.size = 0
+
+    def step(self, grids=None, running=None, env=None):
+        """ Move all active bullets and mark those that left the battlefield
+		Rects of moved bullets are updated, including their position in spatial hash
+		@param numpy.ndarray grids Tile grids of shape (games, rows, columns) bullets of each game fly
+			over. If given, bullets whose path crossed no obstacle tile get clear_path set
+		@param numpy.ndarray running Boolean per game, bullets of games where it is False stay put.
+			None - move bullets of all games
+		@param int env Move bullets of this game only, None - of all games
+		@return None
+		"""
+        n = self.size
+        if n == 0:
+            return
+        moving = self.active[:n]
+        if running is not None:
+            moving = moving & running[self.env[:n]]
+        if env is not None:
+            moving = moving & (self.env[:n] == env)
+        slots = np.flatnonzero(moving)
+        if len(slots) == 0:
+            return
+
+        # velocity is zero for inactive slots, so whole range can be moved at once
+        x = self.x[:n]
+        y = self.y[:n]
+        if running is None and env is None:
+            x += self.vx[:n]
+            y += self.vy[:n]
+        else:
+            x[slots] += self.vx[slots]
+            y[slots] += self.vy[slots]
+        out = self.out_of_bounds[:n]
+        np.less(x, 0, out=out)
+        out |= y < 0
+        out |= x > self.SIZE - self.width[:n]
+        out |= y > self.SIZE - self.height[:n]
+
+        if grids is not None:
+            self.sweep(slots, grids)
+        else:
+            self.clear_path[slots] = False
+
+        objects = self.objects
+        for slot, left, top in zip(slots.tolist(), x[slots].tolist(), y[slots].tolist()):
+            bullet = objects[slot]
+            bullet.rect.topleft = (left, top)
+            bullet.globals.spatial_bullets.update(bullet)
+
+    def sweep(self, slots, grids):
+        """ Find moved bullets whose path from previous position crossed no obstacle
+		Same tiles as Level.sweepObstacles() walks are looked up, for all bullets of all games
+		at once. Those with clear_path set need not be checked against map at all
+		@param numpy.ndarray slots Slots of moved bullets
+		@param numpy.ndarray grids Tile grids of shape (games, rows, columns)
+		@return None
+		"""
+        size = Level.TILE_SIZE
+        last = Level.MAP_SIZE - 1
+        n = self.size
+        x = self.x[:n]
+        y = self.y[:n]
+        vx = self.vx[:n]
+        vy = self.vy[:n]
+
+        # first and last tile covered by bullet before or after the move
+        col0 = np.maximum((x - np.maximum(vx, 0)) // size, 0)[slots]
+        col1 = np.minimum((x - np.minimum(vx, 0) + self.width[:n] - 1) // size, last)[slots]
+        row0 = np.maximum((y - np.maximum(vy, 0)) // size, 0)[slots]
+        row1 = np.minimum((y - np.minimum(vy, 0) + self.height[:n] - 1) // size, last)[slots]
+
+        # SWEEP_TILES x SWEEP_TILES window from the first tile, repeating the last tile where
+        # path is narrower, as flat indices into grids
+        steps = np.arange(self.SWEEP_TILES)
+        rows = np.minimum(row0[:, None] + steps, row1[:, None])
+        cols = np.minimum(col0[:, None] + steps, col1[:, None])
+        cells = (self.env[slots].astype(np.intp) * (Level.MAP_SIZE * Level.MAP_SIZE))[:, None, None] \
+            + (rows * Level.MAP_SIZE)[:, :, None] + cols[:, None, :]
+        tiles = grids.reshape(-1).take(cells, mode="clip")
+
+        clear = ~self.OBSTACLES[tiles].any(axis=(1, 2))
+        # wider paths than the window are not known to be clear
+        clear &= (row1 - row0 < self.SWEEP_TILES) & (col1 - col0 < self.SWEEP_TILES)
+        self.clear_path[slots] = clear
+
+    def setSpeed(self, slot, speed):
+        """ Change bullet's speed
+		@param int slot
+		@param int speed Pixels per tick
+		@return None
+		"""
+        self.speed[slot] = speed
+        if self.active[slot]:
+            direction = self.direction[slot]
+            self.vx[slot] = self.DX[direction] * speed
+            self.vy[slot] = self.DY[direction] * speed
+
+    def deactivate(self, slot):
+        """ Stop moving bullet, it stays in its slot until removed
+		@param int slot
+		@return None
+		"""
+        self.active[slot] = False
+        self.vx[slot] = 0
+        self.vy[slot] = 0
@@ -9,7 +9,7 @@ class Castle():
 
 	(STATE_STANDING, STATE_DESTROYED, STATE_EXPLODING) = range(3)
 
-	def __init__(self, timer, screen, sprites, tricks:Tricks):
+	def __init__(self, timer, screen, atlas, tricks:Tricks):
 
 		self.explosion = None
 		self.image = None
@@ -17,12 +17,12 @@ class Castle():
 		self.active = True
 		self.timer = timer
 		self.screen = screen
-		self.sprites = sprites
+		self.atlas = atlas
 		self.tricks = tricks
 
 		# images
-		self.img_undamaged = sprites.subsurface(0, 15*2, 16*2, 16*2)
-		self.img_destroyed = sprites.subsurface(16*2, 15*2, 16*2, 16*2)
+		self.img_undamaged = atlas.castle
+		self.img_destroyed = atlas.castle_destroyed
 
 		# init position
 		self.rect = pygame.Rect(12*16, 24*16, 32, 32)
@@ -31,15 +31,19 @@ class Castle():
 		self.rebuild()
 
 	def draw(self):
-		""" Draw castle """
-		self.screen.blit(self.image, self.rect.topleft)
+		""" Draw castle
+		@return pygame.Rect Screen area drawn to
+		"""
+		area = self.screen.blit(self.image, self.rect.topleft)
 
 		if self.state == self.STATE_EXPLODING:
 			if not self.explosion.active:
 				self.state = self.STATE_DESTROYED
 				del self.explosion
 			else:
-				self.explosion.draw()
+				area = area.union(self.explosion.draw())
+
+		return area
 
 	def rebuild(self):
 		""" Reset castle """
@@ -50,7 +54,7 @@ class Castle():
 	def destroy(self):
 		""" Destroy castle """
 		self.state = self.STATE_EXPLODING
-		self.explosion = Explosion(self.rect.topleft, self.timer, self.screen, self.sprites)
+		self.explosion = Explosion(self.rect.topleft, self.timer, self.screen, self.atlas.sprites, images=self.atlas.explosion)
 		self.image = self.img_destroyed
 		self.active = False
 		if self.tricks is not None:
@@ -1,14 +1,16 @@
-import random
-
 import pygame
 
 from bonus import Bonus
+from enemypath import EnemyPath
 from tank import Tank
 
 
 class Enemy(Tank):
     (TYPE_BASIC, TYPE_FAST, TYPE_POWER, TYPE_ARMOR) = range(4)
 
+    # chance that enemy follows level's flow field towards castle when choosing where to go
+    FLOW_BIAS = 0.7
+
     def __init__(self, level, type, position=None, direction=None, filename=None, globals = None):
 
         Tank.__init__(self, level, type, position=None, direction=None, filename=None, globals = globals )
@@ -33,30 +35,21 @@ class Enemy(Tank):
             self.health = 400
 
         # 1 in 5 chance this will be bonus carrier, but only if no other tank is
-        if random.randint(1, 5) == 1:
+        if self.globals.rng.randint(1, 5) == 1:
             self.bonus = True
             for enemy in globals.enemies:
                 if enemy.bonus:
                     self.bonus = False
                     break
 
-        images = [
-            globals.sprites.subsurface(32 * 2, 0, 13 * 2, 15 * 2),
-            globals.sprites.subsurface(48 * 2, 0, 13 * 2, 15 * 2),
-            globals.sprites.subsurface(64 * 2, 0, 13 * 2, 15 * 2),
-            globals.sprites.subsurface(80 * 2, 0, 13 * 2, 15 * 2),
-            globals.sprites.subsurface(32 * 2, 16 * 2, 13 * 2, 15 * 2),
-            globals.sprites.subsurface(48 * 2, 16 * 2, 13 * 2, 15 * 2),
-            globals.sprites.subsurface(64 * 2, 16 * 2, 13 * 2, 15 * 2),
-            globals.sprites.subsurface(80 * 2, 16 * 2, 13 * 2, 15 * 2)
-        ]
+        images = globals.atlas.rotations(((32 + self.type * 16) * 2, 0, 13 * 2, 15 * 2))
 
-        self.image = images[self.type + 0]
+        self.image = images[self.DIR_UP]
 
-        self.image_up = self.image;
-        self.image_left = pygame.transform.rotate(self.image, 90)
-        self.image_down = pygame.transform.rotate(self.image, 180)
-        self.image_right = pygame.transform.rotate(self.image, 270)
+        self.image_up = images[self.DIR_UP]
+        self.image_left = images[self.DIR_LEFT]
+        self.image_down = images[self.DIR_DOWN]
+        self.image_right = images[self.DIR_RIGHT]
 
         if self.bonus:
             self.image1_up = self.image_up;
@@ -64,29 +57,35 @@ class Enemy(Tank):
             self.image1_down = self.image_down
             self.image1_right = self.image_right
 
-            self.image2 = images[self.type + 4]
-            self.image2_up = self.image2;
-            self.image2_left = pygame.transform.rotate(self.image2, 90)
-            self.image2_down = pygame.transform.rotate(self.image2, 180)
-            self.image2_right = pygame.transform.rotate(self.image2, 270)
+            images = globals.atlas.rotations(((32 + self.type * 16) * 2, 16 * 2, 13 * 2, 15 * 2))
+            self.image2 = images[self.DIR_UP]
+            self.image2_up = images[self.DIR_UP]
+            self.image2_left = images[self.DIR_LEFT]
+            self.image2_down = images[self.DIR_DOWN]
+            self.image2_right = images[self.DIR_RIGHT]
 
         self.rotate(self.direction, False)
 
         if position == None:
-            self.rect.topleft = self.getFreeSpawningPosition()
-            if not self.rect.topleft:
+            position = self.getFreeSpawningPosition()
+            if not position:
+                # all spawn points are taken, leave this one for later
+                level.enemies_left.append(self.type)
+                self.timer.destroy(self.timer_uuid_spawn)
+                self.timer.destroy(self.timer_uuid_spawn_end)
                 self.state = self.STATE_DEAD
                 return
+            self.rect.topleft = position
 
-        # list of map coords where tank should go next
+        # EnemyPath, positions where tank should go next
         self.path = self.generatePath(self.direction)
 
         # 1000 is duration between shots
-        self.timer_uuid_fire = self.timer.add(1000, lambda: self.fire())
+        self.timer_uuid_fire = self.timer.add(1000, self.fire)
 
         # turn on flashing
         if self.bonus:
-            self.timer_uuid_flash = self.timer.add(200, lambda: self.toggleFlash())
+            self.timer_uuid_flash = self.timer.add(200, self.toggleFlash)
 
     def toggleFlash(self):
         """ Toggle flash state """
@@ -113,8 +112,9 @@ class Enemy(Tank):
             return
         bonus = Bonus(self.level, self.globals)
         self.globals.bonuses.append(bonus)
-        self.timer.add(500, lambda: bonus.toggleVisibility())
-        self.timer.add(10000, lambda: self.globals.bonuses.remove(bonus), 1)
+        self.globals.spatial_bonuses.insert(bonus)
+        self.timer.add(500, bonus.toggleVisibility)
+        self.timer.add(10000, bonus.remove, 1)
 
     def getFreeSpawningPosition(self):
 
@@ -126,28 +126,18 @@ class Enemy(Tank):
              (self.level.TILE_SIZE * 2 - self.rect.height) / 2]
         ]
 
-        random.shuffle(available_positions)
+        self.globals.rng.shuffle(available_positions)
 
         for pos in available_positions:
 
             enemy_rect = pygame.Rect(pos, [26, 26])
 
-            # collisions with other enemies
-            collision = False
-            for enemy in self.globals.enemies:
-                if enemy_rect.colliderect(enemy.rect):
-                    collision = True
-                    continue
-
-            if collision:
-                continue
-
-            # collisions with players
+            # collisions with other enemies and players
             collision = False
-            for player in self.globals.players:
-                if enemy_rect.colliderect(player.rect):
+            for tank in self.globals.spatial_tanks.query(enemy_rect):
+                if enemy_rect.colliderect(tank.rect):
                     collision = True
-                    continue
+                    break
 
             if collision:
                 continue
@@ -161,10 +151,10 @@ class Enemy(Tank):
         if self.state != self.STATE_ALIVE or self.paused or self.paralised:
             return
 
-        if self.path == []:
+        if self.path.finished():
             self.path = self.generatePath(None, True)
 
-        new_position = self.path.pop(0)
+        new_position = self.path.next()
 
         # move enemy
         if self.direction == self.DIR_UP:
@@ -187,31 +177,25 @@ class Enemy(Tank):
         new_rect = pygame.Rect(new_position, [26, 26])
 
         # collisions with tiles
-        if new_rect.collidelist(self.level.obstacle_rects) != -1:
+        if self.level.collideObstacles(new_rect):
             self.path = self.generatePath(self.direction, True)
             return
 
-        # collisions with other enemies
-        for enemy in self.globals.enemies:
-            if enemy != self and new_rect.colliderect(enemy.rect):
-                self.turnAround()
-                self.path = self.generatePath(self.direction)
-                return
-
-        # collisions with players
-        for player in self.globals.players:
-            if new_rect.colliderect(player.rect):
+        # collisions with other enemies and players
+        for tank in self.globals.spatial_tanks.query(new_rect):
+            if tank != self and new_rect.colliderect(tank.rect):
                 self.turnAround()
                 self.path = self.generatePath(self.direction)
                 return
 
         # collisions with bonuses
-        for bonus in self.globals.bonuses:
+        for bonus in self.globals.spatial_bonuses.query(new_rect):
             if new_rect.colliderect(bonus.rect):
-                self.globals.bonuses.remove(bonus)
+                bonus.remove()
 
         # if no collision, move enemy
         self.rect.topleft = new_rect.topleft
+        self.globals.spatial_tanks.update(self)
 
     def update(self, time_passed):
         Tank.update(self, time_passed)
@@ -220,6 +204,7 @@ class Enemy(Tank):
 
     def generatePath(self, direction=None, fix_direction=False):
         """ If direction is specified, try continue that way, otherwise choose at random
+		@return EnemyPath
 		"""
 
         all_directions = [self.DIR_UP, self.DIR_RIGHT, self.DIR_DOWN, self.DIR_LEFT]
@@ -230,7 +215,7 @@ class Enemy(Tank):
             else:
                 opposite_direction = self.direction - 2
             directions = all_directions
-            random.shuffle(directions)
+            self.globals.rng.shuffle(directions)
             directions.remove(opposite_direction)
             directions.append(opposite_direction)
         else:
@@ -244,12 +229,20 @@ class Enemy(Tank):
             else:
                 opposite_direction = direction - 2
             directions = all_directions
-            random.shuffle(directions)
+            self.globals.rng.shuffle(directions)
             directions.remove(opposite_direction)
             directions.remove(direction)
             directions.insert(0, direction)
             directions.append(opposite_direction)
 
+        # mostly head for castle, wander otherwise
+        flow = None
+        if self.globals.rng.random() < self.FLOW_BIAS:
+            flow = self.level.flow_field.direction(self.rect)
+            if flow is not None:
+                directions.remove(flow[0])
+                directions.insert(0, flow[0])
+
         # at first, work with general units (steps) not px
         x = int(round(self.rect.left / 16))
         y = int(round(self.rect.top / 16))
@@ -259,22 +252,22 @@ class Enemy(Tank):
         for direction in directions:
             if direction == self.DIR_UP and y > 1:
                 new_pos_rect = self.rect.move(0, -8)
-                if new_pos_rect.collidelist(self.level.obstacle_rects) == -1:
+                if not self.level.collideObstacles(new_pos_rect):
                     new_direction = direction
                     break
             elif direction == self.DIR_RIGHT and x < 24:
                 new_pos_rect = self.rect.move(8, 0)
-                if new_pos_rect.collidelist(self.level.obstacle_rects) == -1:
+                if not self.level.collideObstacles(new_pos_rect):
                     new_direction = direction
                     break
             elif direction == self.DIR_DOWN and y < 24:
                 new_pos_rect = self.rect.move(0, 8)
-                if new_pos_rect.collidelist(self.level.obstacle_rects) == -1:
+                if not self.level.collideObstacles(new_pos_rect):
                     new_direction = direction
                     break
             elif direction == self.DIR_LEFT and x > 1:
                 new_pos_rect = self.rect.move(-8, 0)
-                if new_pos_rect.collidelist(self.level.obstacle_rects) == -1:
+                if not self.level.collideObstacles(new_pos_rect):
                     new_direction = direction
                     break
 
@@ -289,30 +282,10 @@ class Enemy(Tank):
 
         self.rotate(new_direction, fix_direction)
 
-        positions = []
-
-        x = self.rect.left
-        y = self.rect.top
-
-        if new_direction in (self.DIR_RIGHT, self.DIR_LEFT):
-            axis_fix = self.nearest(y, 16) - y
+        if flow is not None and new_direction == flow[0]:
+            # go straight until flow field turns
+            pixels = flow[1] * self.level.TILE_SIZE + 1
         else:
-            axis_fix = self.nearest(x, 16) - x
-        axis_fix = 0
-
-        pixels = self.nearest(random.randint(1, 12) * 32, 32) + axis_fix + 3
-
-        if new_direction == self.DIR_UP:
-            for px in range(0, pixels, self.speed):
-                positions.append([x, y - px])
-        elif new_direction == self.DIR_RIGHT:
-            for px in range(0, pixels, self.speed):
-                positions.append([x + px, y])
-        elif new_direction == self.DIR_DOWN:
-            for px in range(0, pixels, self.speed):
-                positions.append([x, y + px])
-        elif new_direction == self.DIR_LEFT:
-            for px in range(0, pixels, self.speed):
-                positions.append([x - px, y])
-
-        return positions
+            pixels = self.nearest(self.globals.rng.randint(1, 12) * 32, 32) + 3
+
+        return EnemyPath(self.rect.topleft, new_direction, pixels, self.speed)
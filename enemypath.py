@@ -0,0 +1,39 @@
+class EnemyPath():
+    """ Straight line an enemy follows, walked one step at a time
+
+    Positions are computed when asked for instead of being stored, so creating and
+    dropping a path costs the same no matter how long it is.
+    """
+
+    # movement per direction (DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT)
+    DX = (0, 1, 0, -1)
+    DY = (-1, 0, 1, 0)
+
+    def __init__(self, start, direction, length, speed):
+        """
+		@param tuple start Top left corner (in px) path begins at, this is also its first position
+		@param int direction
+		@param int length Path length in px
+		@param int speed Distance (in px) between positions
+		"""
+        self.x, self.y = start
+        self.dx = self.DX[direction] * speed
+        self.dy = self.DY[direction] * speed
+
+        # number of positions, same as len(range(0, length, speed))
+        self.steps = (length + speed - 1) // speed
+        self.index = 0
+
+    def finished(self):
+        """ Whether all positions have been taken
+		@return boolean
+		"""
+        return self.index >= self.steps
+
+    def next(self):
+        """ Take next position
+		@return list Top left corner in px
+		"""
+        i = self.index
+        self.index = i + 1
+        return [self.x + self.dx * i, self.y + self.dy * i]
@@ -0,0 +1,253 @@
+""" Game as a reinforcement learning environment
+
+Drives a headless Game one step at a time with the same interface as Gym
+environments: reset() starts an episode (one stage), step() applies actions of
+all players and returns observation, rewards, whether episode ended and extra
+information. For example:
+
+    env = Environment()
+    observation, info = env.reset(stage=1, seed=0)
+    while True:
+        observation, rewards, terminated, truncated, info = env.step([env.rng.randrange(len(env.ACTIONS))])
+        if terminated or truncated:
+            break
+"""
+
+import contextlib
+import os
+import random
+
+import numpy as np
+
+from castle import Castle
+from game import Game
+from globals import Globals
+from inputs import Inputs
+from level import Level
+from observation import ObservationRenderer
+from timer import Timer
+
+
+class Environment():
+
+    # discrete actions, index => Inputs bit mask
+    ACTIONS = (
+        Inputs.NONE, Inputs.UP, Inputs.RIGHT, Inputs.DOWN, Inputs.LEFT,
+        Inputs.FIRE, Inputs.UP | Inputs.FIRE, Inputs.RIGHT | Inputs.FIRE,
+        Inputs.DOWN | Inputs.FIRE, Inputs.LEFT | Inputs.FIRE,
+    )
+
+    # observation cell values on top of Level.TILE_* ones
+    (CELL_PLAYER, CELL_ENEMY, CELL_BULLET, CELL_BONUS, CELL_CASTLE) = range(6, 11)
+
+    # reward per point of score, a basic tank is worth 100 points
+    SCORE_REWARD = 0.01
+
+    # reward when player loses life and when castle is destroyed
+    LIFE_REWARD = -1.0
+    CASTLE_REWARD = -10.0
+
+    def __init__(self, players=1, frame_skip=1, max_ticks=None, lives=None, shared=None, cell_size=None):
+        """
+		@param int players 1 or 2
+		@param int frame_skip Ticks played per step, actions are held during all of them
+		@param int max_ticks Truncate episode after this many ticks, None - never
+		@param int lives Lives players start with, None - game's default
+		@param Environment shared Reuse images, fonts, screen and level cache of this environment
+		@param int cell_size If given, observations are ObservationRenderer layers with cells
+			of this many pixels instead of a map of tiles
+		"""
+        self.players = players
+        self.frame_skip = frame_skip
+        self.max_ticks = max_ticks
+        self.lives = lives
+
+        self.renderer = None if cell_size is None else ObservationRenderer(cell_size)
+
+        # shape of observations
+        if self.renderer is not None:
+            self.observation_shape = self.renderer.shape
+        else:
+            self.observation_shape = (Level.MAP_SIZE, Level.MAP_SIZE)
+
+        # for picking seeds and random actions, seeded by reset()
+        self.rng = random.Random()
+
+        timer = Timer()
+        if shared is None:
+            globals = Globals(None, timer, None, None, [], [], [], [], [], None, False, {})
+        else:
+            globals = Globals(None, timer, shared.globals.sprites, shared.globals.screen, [], [], [], [], [], None, False, {})
+            globals.atlas = shared.globals.atlas
+            globals.text = shared.globals.text
+        self.game = Game(globals, True)
+        if shared is not None:
+            self.game.level_cache = shared.game.level_cache
+        globals.castle = Castle(timer, globals.screen, globals.atlas, None)
+        self.globals = globals
+
+        # score and lives of every player after previous step
+        self.scores = [0] * players
+        self.lives_left = [0] * players
+
+        self.done = True
+
+        # Inputs bit mask of every player for ticks of current step, see applyActions()
+        self.inputs = []
+
+        # how current step ended the episode, see checkOutcome()
+        self.outcome = None
+
+        # game prints stage and game over messages, they are sent here
+        self.devnull = open(os.devnull, "w")
+
+    def reset(self, stage=1, seed=None):
+        """ Start new episode
+		@param int stage Stage number
+		@param int seed Seed of game's random generator, None - pick one
+		@return tuple Observation and info dict
+		"""
+        if seed is None:
+            seed = self.rng.getrandbits(32)
+        self.rng.seed(seed)
+
+        game = self.game
+        del self.globals.players[:]
+        game.nr_of_players = self.players
+        game.stage = stage - 1
+
+        with contextlib.redirect_stdout(self.devnull):
+            game.startLevel(seed)
+
+        for player in self.globals.players:
+            if self.lives is not None:
+                player.lives = self.lives
+        self.scores = [player.score for player in self.globals.players]
+        self.lives_left = [player.lives for player in self.globals.players]
+        self.done = False
+
+        return self.observe(), {"stage": game.stage, "seed": seed}
+
+    def step(self, actions):
+        """ Play frame_skip ticks
+		@param list actions Index into ACTIONS for every player, or single index
+		@return tuple Observation, numpy array of rewards per player, whether episode
+			ended (terminated), whether it was cut short by max_ticks (truncated) and info dict
+		"""
+        rewards, terminated, truncated, info = self.advance(actions)
+        return self.observe(), rewards, terminated, truncated, info
+
+    def advance(self, actions):
+        """ Same as step(), but without observation
+		@return tuple Rewards, terminated, truncated and info dict
+		"""
+        self.applyActions(actions)
+        game = self.game
+        with contextlib.redirect_stdout(self.devnull):
+            for tick in range(self.frame_skip):
+                game.step(self.inputs)
+                if self.checkOutcome():
+                    break
+        return self.collectRewards()
+
+    def applyActions(self, actions):
+        """ Start step: turn actions into inputs held during all of its ticks
+		@param list actions Index into ACTIONS for every player, or single index
+		@return None
+		"""
+        if self.done:
+            raise RuntimeError("episode is over, call reset()")
+        # single action, possibly a NumPy integer
+        if np.ndim(actions) == 0:
+            actions = (actions,)
+        self.inputs = [self.ACTIONS[action] for action in actions]
+        self.outcome = None
+
+    def checkOutcome(self):
+        """ Find out whether the last tick ended the episode
+		@return boolean True if it did, outcome is then set to how
+		"""
+        game = self.game
+        if not self.globals.castle.active:
+            self.outcome = "castle"
+        elif game.game_over:
+            self.outcome = "players"
+        elif not game.active:
+            self.outcome = "cleared"
+        return self.outcome is not None
+
+    def collectRewards(self):
+        """ Finish step: rewards for what happened during its ticks
+		@return tuple Rewards, terminated, truncated and info dict
+		"""
+        game = self.game
+        globals = self.globals
+        outcome = self.outcome
+
+        rewards = np.zeros(self.players, dtype=np.float32)
+        for n, player in enumerate(globals.players):
+            rewards[n] = (player.score - self.scores[n]) * self.SCORE_REWARD
+            if player.lives < self.lives_left[n]:
+                rewards[n] += (self.lives_left[n] - player.lives) * self.LIFE_REWARD
+            self.scores[n] = player.score
+            self.lives_left[n] = player.lives
+        if outcome == "castle":
+            rewards += self.CASTLE_REWARD
+
+        terminated = outcome is not None
+        truncated = not terminated and self.max_ticks is not None and game.ticks >= self.max_ticks
+        self.done = terminated or truncated
+
+        info = {"ticks": game.ticks, "outcome": outcome}
+        if self.done:
+            info["kills"] = [
+                [player.trophies["enemy" + str(n)] for n in range(4)] for player in globals.players
+            ]
+            info["score"] = list(self.scores)
+
+        return rewards, terminated, truncated, info
+
+    def observe(self, out=None):
+        """ Map of the battlefield, one cell per tile, or renderer's layers if there is renderer
+		Cells hold Level.TILE_* values, cells covered by an object hold one of CELL_* values
+		instead. Bullets are drawn over tanks and tanks over bonuses
+		@param numpy.ndarray out Array to write observation into instead of a new one
+		@return numpy.ndarray uint8 array of shape observation_shape
+		"""
+        if self.renderer is not None:
+            return self.renderer.render(self.game, out)
+
+        if out is None:
+            cells = self.game.level.grid.copy()
+        else:
+            cells = out
+            cells[:] = self.game.level.grid
+        return self.stampObjects(cells)
+
+    def stampObjects(self, cells):
+        """ Mark cells covered by objects on map of tiles
+		@param numpy.ndarray cells Map of tile types, changed in place
+		@return numpy.ndarray cells
+		"""
+        globals = self.globals
+        level = self.game.level
+        row0, row1, col0, col1 = level.tileRange(globals.castle.rect)
+        cells[row0:row1, col0:col1] = self.CELL_CASTLE
+        for bonus in globals.bonuses:
+            if bonus.active:
+                row0, row1, col0, col1 = level.tileRange(bonus.rect)
+                cells[row0:row1, col0:col1] = self.CELL_BONUS
+        for enemy in globals.enemies:
+            row0, row1, col0, col1 = level.tileRange(enemy.rect)
+            cells[row0:row1, col0:col1] = self.CELL_ENEMY
+        for player in globals.players:
+            row0, row1, col0, col1 = level.tileRange(player.rect)
+            cells[row0:row1, col0:col1] = self.CELL_PLAYER
+        for bullet in globals.bullets:
+            row0, row1, col0, col1 = level.tileRange(bullet.rect)
+            cells[row0:row1, col0:col1] = self.CELL_BULLET
+        return cells
+
+    def close(self):
+        self.done = True
+        self.devnull.close()
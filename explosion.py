@@ -2,6 +2,10 @@
 
 class Explosion():
 	def __init__(self, position, timer, screen, sprites, interval = None, images = None):
+		self.reset(position, timer, screen, sprites, interval, images)
+
+	def reset(self, position, timer, screen, sprites, interval = None, images = None):
+		""" (Re)start explosion, called also when explosion is reused from pool """
 
 		self.timer = timer
 		self.screen = screen
@@ -19,17 +23,18 @@ class Explosion():
 				sprites.subsurface(64*2, 80*2, 32*2, 32*2)
 			]
 
-		images.reverse()
-
-		self.images = [] + images
+		# frames left to show, next one is last
+		self.images = images[::-1]
 
 		self.image = self.images.pop()
 
-		timer.add(interval, lambda :self.update(), len(self.images) + 1)
+		timer.add(interval, self.update, len(self.images) + 1)
 
 	def draw(self):
-		""" draw current explosion frame """
-		self.screen.blit(self.image, self.position)
+		""" draw current explosion frame
+		@return pygame.Rect Screen area drawn to
+		"""
+		return self.screen.blit(self.image, self.position)
 
 	def update(self):
 		""" Advace to the next image """
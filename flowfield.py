@@ -0,0 +1,255 @@
+import array
+import heapq
+
+
+class FlowField():
+    """ Cheapest way to the castle from every tank position on the map
+
+    Nodes are tank positions aligned to the tile grid: node (row, col) is a tank whose
+    26x26 body covers tiles row..row+1 and col..col+1. Entering a node costs 1, plus
+    BRICK_COST for every brick under it, since enemies have to shoot their way through.
+    Nodes with steel or overlapping castle cannot be entered. Goal nodes are those next
+    to the castle, where a tank can shoot it.
+
+    The field is built once with Dijkstra and then patched with tileChanged() whenever a
+    tile changes, recomputing only nodes whose distance could have changed.
+    """
+
+    # direction constants, same as Tank's
+    (DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT) = range(4)
+
+    # extra cost of entering node for every brick tile under it
+    BRICK_COST = 8
+
+    INFINITY = float("inf")
+
+    # size => neighbours of every node, the same for all fields of that size
+    neighbour_tables = {}
+
+    def __init__(self, level, castle_rect):
+        self.level = level
+
+        # nodes per row and column
+        self.size = level.MAP_SIZE - 1
+
+        tile = level.TILE_SIZE
+        self.castle_tiles = (
+            castle_rect.top // tile, (castle_rect.bottom - 1) // tile,
+            castle_rect.left // tile, (castle_rect.right - 1) // tile
+        )
+
+        n = self.size * self.size
+
+        # per node (index row * size + col): cost of entering, distance to castle and
+        # next node on the way there (-1 for goals and unreachable nodes)
+        self.cost = [self.nodeCost(node) for node in range(n)]
+        self.dist = [self.INFINITY] * n
+        self.next = [-1] * n
+
+        self.goals = set(node for node in range(n) if self.isGoal(node))
+
+        self.neighbours = self.neighbourTable(self.size)
+
+        queue = []
+        for node in self.goals:
+            if self.cost[node] != self.INFINITY:
+                self.dist[node] = self.cost[node]
+                queue.append((self.dist[node], node))
+        heapq.heapify(queue)
+        self.propagate(queue)
+
+    @classmethod
+    def neighbourTable(cls, size):
+        """ Nodes a tank can get to from each node in one step
+		@return tuple Tuple of neighbour nodes for every node
+		"""
+        table = cls.neighbour_tables.get(size)
+        if table is None:
+            nodes = []
+            for node in range(size * size):
+                row, col = divmod(node, size)
+                neighbours = []
+                if row > 0:
+                    neighbours.append(node - size)
+                if col < size - 1:
+                    neighbours.append(node + 1)
+                if row < size - 1:
+                    neighbours.append(node + size)
+                if col > 0:
+                    neighbours.append(node - 1)
+                nodes.append(tuple(neighbours))
+            table = cls.neighbour_tables[size] = tuple(nodes)
+        return table
+
+    def copy(self, level):
+        """ Independent copy of field for another level with the same map
+		@param Level level
+		@return FlowField
+		"""
+        field = FlowField.__new__(FlowField)
+        field.__dict__.update(self.__dict__)
+        field.level = level
+        field.cost = list(self.cost)
+        field.dist = list(self.dist)
+        field.next = list(self.next)
+        return field
+
+    def __getstate__(self):
+        """ Per node lists are pickled as flat arrays, shared neighbour table is left out """
+        state = self.__dict__.copy()
+        del state["neighbours"]
+        state["cost"] = array.array("f", self.cost)
+        state["dist"] = array.array("f", self.dist)
+        state["next"] = array.array("h", self.next)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cost = self.cost.tolist()
+        self.dist = self.dist.tolist()
+        self.next = self.next.tolist()
+        self.neighbours = self.neighbourTable(self.size)
+
+    def overlapsCastle(self, row, col):
+        top, bottom, left, right = self.castle_tiles
+        return row <= bottom and row + 1 >= top and col <= right and col + 1 >= left
+
+    def isGoal(self, node):
+        """ Whether tank at node is next to castle and can shoot it """
+        row, col = divmod(node, self.size)
+        if self.overlapsCastle(row, col):
+            return False
+        top, bottom, left, right = self.castle_tiles
+        rows_overlap = row <= bottom and row + 1 >= top
+        cols_overlap = col <= right and col + 1 >= left
+        return (rows_overlap and (col + 2 == left or col == right + 1)) \
+            or (cols_overlap and (row + 2 == top or row == bottom + 1))
+
+    def nodeCost(self, node):
+        """ Cost of entering node, INFINITY if tank cannot be there """
+        row, col = divmod(node, self.size)
+        if self.overlapsCastle(row, col):
+            return self.INFINITY
+        level = self.level
+        cost = 1
+        for tile in level.grid[row:row + 2, col:col + 2].flat:
+            if tile == level.TILE_STEEL:
+                return self.INFINITY
+            if tile == level.TILE_BRICK:
+                cost += self.BRICK_COST
+        return cost
+
+    def propagate(self, queue):
+        """ Dijkstra from nodes in queue, lowering distances of their neighbours
+		@param list queue Heap of (distance, node)
+		@return None
+		"""
+        dist = self.dist
+        cost = self.cost
+        next_node = self.next
+        neighbours = self.neighbours
+        while queue:
+            d, node = heapq.heappop(queue)
+            if d > dist[node]:
+                continue
+            for other in neighbours[node]:
+                nd = d + cost[other]
+                if nd < dist[other]:
+                    dist[other] = nd
+                    next_node[other] = node
+                    heapq.heappush(queue, (nd, other))
+
+    def tileChanged(self, row, col):
+        """ Update field after map tile has changed
+		@param int row
+		@param int col
+		@return None
+		"""
+        size = self.size
+        changed = []
+        raised = []
+        for r in (row - 1, row):
+            for c in (col - 1, col):
+                if 0 <= r < size and 0 <= c < size:
+                    node = r * size + c
+                    cost = self.nodeCost(node)
+                    if cost != self.cost[node]:
+                        if cost > self.cost[node]:
+                            raised.append(node)
+                        self.cost[node] = cost
+                        changed.append(node)
+        if not changed:
+            return
+
+        # nodes whose way to castle led through a node that got more expensive
+        # must forget their distance
+        invalid = set()
+        if raised:
+            children = {}
+            for node, parent in enumerate(self.next):
+                if parent != -1:
+                    children.setdefault(parent, []).append(node)
+            stack = raised
+            while stack:
+                node = stack.pop()
+                if node in invalid:
+                    continue
+                invalid.add(node)
+                self.dist[node] = self.INFINITY
+                self.next[node] = -1
+                stack.extend(children.get(node, ()))
+
+        # find best distance of those nodes from their neighbours and spread it
+        queue = []
+        for node in invalid.union(changed):
+            cost = self.cost[node]
+            if cost == self.INFINITY:
+                continue
+            if node in self.goals:
+                best, parent = cost, -1
+            else:
+                best, parent = self.INFINITY, -1
+                for other in self.neighbours[node]:
+                    if self.dist[other] + cost < best:
+                        best, parent = self.dist[other] + cost, other
+            if best < self.dist[node]:
+                self.dist[node] = best
+                self.next[node] = parent
+                heapq.heappush(queue, (best, node))
+        self.propagate(queue)
+
+    def nodeAt(self, rect):
+        """ Node nearest to tank's position
+		@param pygame.Rect rect Tank's rect
+		@return int
+		"""
+        tile = self.level.TILE_SIZE
+        row = min(max(int(round((rect.top - 3) / tile)), 0), self.size - 1)
+        col = min(max(int(round((rect.left - 3) / tile)), 0), self.size - 1)
+        return row * self.size + col
+
+    def direction(self, rect):
+        """ Which way tank should go to get closer to castle
+		@param pygame.Rect rect Tank's rect
+		@return tuple Direction and number of nodes to go that way before turning,
+			None if tank is already next to castle or cannot get there
+		"""
+        node = self.nodeAt(rect)
+        parent = self.next[node]
+        if parent == -1:
+            return None
+        step = parent - node
+        if step == -self.size:
+            direction = self.DIR_UP
+        elif step == 1:
+            direction = self.DIR_RIGHT
+        elif step == self.size:
+            direction = self.DIR_DOWN
+        else:
+            direction = self.DIR_LEFT
+
+        run = 1
+        while self.next[parent] != -1 and self.next[parent] - parent == step:
+            parent = self.next[parent]
+            run += 1
+        return direction, run
@@ -1,16 +1,18 @@
 #!/usr/bin/python
 # coding=utf-8
 
-import os, pygame, time, random, uuid, sys
+import os, pygame, random, time, sys, zlib
 
+from atlas import SpriteAtlas
 from castle import Castle
 from enemy import Enemy
 from globals import Globals
+from inputs import Inputs
 from joystick import joystick_handler
-from label import Label
-from level import Level
+from levelcache import LevelCache
 from timer import Timer
 from player import Player
+from replay import Replay
 from tricks import Tricks
 
 
@@ -20,10 +22,59 @@ class Game():
 
     TILE_SIZE = 16
 
-    def __init__(self, globals):
+    # duration of one simulated tick in ms (game runs at 50 fps)
+    TICK = 20
+
+    def __init__(self, globals, headless=False):
+        """ If headless is True, no window is opened, no sounds are played and no
+		joysticks are polled. Levels are then simulated as fast as possible and nothing
+		is drawn unless self.draw is added to self.observers """
         self.globals = globals
-        # center window
-        os.environ['SDL_VIDEO_WINDOW_POS'] = 'center'
+        self.headless = headless
+
+        # called w/o arguments after every tick, e.g. to draw the world
+        self.observers = [] if headless else [self.draw]
+
+        # if True, only changed parts of screen are put on display (see present)
+        self.dirty_rendering = True
+
+        # if True, next frame is put on display as whole
+        self.full_redraw = True
+
+        # screen areas drawn to in previous frame
+        self.drawn_rects = []
+
+        # what sidebar showed when it was last drawn
+        self.sidebar_state = None
+
+        # pre-rendered sidebar, redrawn only when sidebar_state changes
+        self.sidebar_layer = pygame.Surface((64, 416))
+
+        # stop the stage after this many ticks (None - play until the end)
+        self.max_ticks = None
+
+        # FrameProfiler timing main loop phases, None when profiling is off
+        self.profiler = None
+
+        # directory to save replay of every played stage to, None when not recording
+        self.record_dir = None
+
+        # NetPlay exchanging inputs with the other side of network game, None when playing locally
+        self.netplay = None
+
+        # parsed levels new stages are copied from
+        self.level_cache = LevelCache(globals, not headless)
+
+        # array every level of this game keeps its tile types in, None - each level has its own
+        self.grid = None
+
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+            self.globals.play_sounds = False
+        else:
+            # center window
+            os.environ['SDL_VIDEO_WINDOW_POS'] = 'center'
 
         if self.globals.play_sounds:
             pygame.mixer.pre_init(44100, -16, 1, 512)
@@ -31,29 +82,40 @@ class Game():
         pygame.init()
 
         # init joystick
-        self.joycount = pygame.joystick.get_count()
+        self.joycount = 0 if headless else pygame.joystick.get_count()
         self.joysticks = []
         for i in range(self.joycount):
             self.joysticks.append(joystick_handler(i))
 
-        pygame.display.set_caption("Battle City")
-
         size = width, height = 480, 416
 
-        if "-f" in sys.argv[1:]:
-            self.globals.screen = pygame.display.set_mode(size, pygame.FULLSCREEN)
+        if headless:
+            # games simulated side by side may share one screen they never show
+            if self.globals.screen is None:
+                self.globals.screen = pygame.Surface(size)
         else:
-            self.globals.screen = pygame.display.set_mode(size)
+            pygame.display.set_caption("Battle City")
+
+            if "-f" in sys.argv[1:]:
+                self.globals.screen = pygame.display.set_mode(size, pygame.FULLSCREEN)
+            else:
+                self.globals.screen = pygame.display.set_mode(size)
 
         self.clock = pygame.time.Clock()
 
-        # load sprites (funky version)
-        # sprites = pygame.transform.scale2x(pygame.image.load("images/sprites.gif"))
-        # load sprites (pixely version)
-        self.globals.sprites = pygame.transform.scale(pygame.image.load("images/sprites.gif"), [192, 224])
-        # screen.set_colorkey((0,138,104))
+        # sprites and atlas may be shared with another game, see Environment
+        if self.globals.sprites is None:
+            # load sprites (funky version)
+            # sprites = pygame.transform.scale2x(pygame.image.load("images/sprites.gif"))
+            # load sprites (pixely version)
+            self.globals.sprites = pygame.transform.scale(pygame.image.load("images/sprites.gif"), [192, 224])
+            # screen.set_colorkey((0,138,104))
+
+        if self.globals.atlas is None:
+            self.globals.atlas = SpriteAtlas(self.globals.sprites)
 
-        pygame.display.set_icon(self.globals.sprites.subsurface(0, 0, 13 * 2, 13 * 2))
+        if not headless:
+            pygame.display.set_icon(self.globals.sprites.subsurface(0, 0, 13 * 2, 13 * 2))
 
         # load sounds
         if self.globals.play_sounds:
@@ -69,24 +131,24 @@ class Game():
             self.globals.sounds["brick"] = pygame.mixer.Sound("sounds/brick.ogg")
             self.globals.sounds["steel"] = pygame.mixer.Sound("sounds/steel.ogg")
 
-        self.enemy_life_image = self.globals.sprites.subsurface(81 * 2, 57 * 2, 7 * 2, 7 * 2)
-        self.player_life_image = self.globals.sprites.subsurface(89 * 2, 56 * 2, 7 * 2, 8 * 2)
-        self.flag_image = self.globals.sprites.subsurface(64 * 2, 49 * 2, 16 * 2, 15 * 2)
+        self.enemy_life_image = self.globals.atlas.enemy_life
+        self.player_life_image = self.globals.atlas.player_life
+        self.flag_image = self.globals.atlas.flag
 
         # this is used in intro screen
-        self.player_image = pygame.transform.rotate(self.globals.sprites.subsurface(0, 0, 13 * 2, 13 * 2), 270)
+        self.player_image = self.globals.atlas.rotations((0, 0, 13 * 2, 13 * 2))[self.DIR_RIGHT]
 
         # if true, no new enemies will be spawn during this time
         self.timefreeze = False
 
         # load custom font
-        self.font = pygame.font.Font("fonts/prstart.ttf", 16)
+        self.font = self.globals.text.font("fonts/prstart.ttf", 16)
 
         # pre-render game over text
         self.im_game_over = pygame.Surface((64, 40))
         self.im_game_over.set_colorkey((0, 0, 0))
-        self.im_game_over.blit(self.font.render("GAME", False, (127, 64, 64)), [0, 0])
-        self.im_game_over.blit(self.font.render("OVER", False, (127, 64, 64)), [0, 20])
+        self.im_game_over.blit(self.globals.text.render(self.font, "GAME", False, (127, 64, 64)), [0, 0])
+        self.im_game_over.blit(self.globals.text.render(self.font, "OVER", False, (127, 64, 64)), [0, 20])
         self.game_over_y = 416 + 40
 
         # number of players. here is defined preselected menu value
@@ -113,7 +175,7 @@ class Game():
             self.shieldPlayer(player, True, 10000)
         elif bonus.bonus == bonus.BONUS_SHOVEL:
             self.level.buildFortress(self.level.TILE_STEEL)
-            self.globals.timer.add(10000, lambda: self.level.buildFortress(self.level.TILE_BRICK), 1)
+            self.globals.timer.add(10000, self.level.buildFortress, 1, (self.level.TILE_BRICK,))
         elif bonus.bonus == bonus.BONUS_STAR:
             player.superpowers += 1
             if player.superpowers == 2:
@@ -122,10 +184,10 @@ class Game():
             player.lives += 1
         elif bonus.bonus == bonus.BONUS_TIMER:
             self.toggleEnemyFreeze(True)
-            self.globals.timer.add(10000, lambda: self.toggleEnemyFreeze(False), 1)
-        self.globals.bonuses.remove(bonus)
+            self.globals.timer.add(10000, self.toggleEnemyFreeze, 1, (False,))
+        bonus.remove()
 
-        self.globals.labels.append(Label(bonus.rect.topleft, "500", 500, globals=self.globals))
+        self.globals.labels.append(self.globals.label_pool.acquire(bonus.rect.topleft, "500", 500, globals=self.globals))
 
     def shieldPlayer(self, player, shield=True, duration=None):
         """ Add/remove shield
@@ -135,12 +197,12 @@ class Game():
 		"""
         player.shielded = shield
         if shield:
-            player.timer_uuid_shield = self.globals.timer.add(100, lambda: player.toggleShieldImage())
+            player.timer_uuid_shield = self.globals.timer.add(100, player.toggleShieldImage)
         else:
             self.globals.timer.destroy(player.timer_uuid_shield)
 
         if shield and duration != None:
-            self.globals.timer.add(duration, lambda: self.shieldPlayer(player, False), 1)
+            self.globals.timer.add(duration, self.shieldPlayer, 1, (player, False))
 
     def spawnEnemy(self):
         """ Spawn new enemy if needed
@@ -155,7 +217,10 @@ class Game():
         if len(self.level.enemies_left) < 1 or self.timefreeze:
             return
         enemy = Enemy(self.level, 1, globals=self.globals)
+        if enemy.state == enemy.STATE_DEAD:
+            return
         self.globals.enemies.append(enemy)
+        self.globals.spatial_tanks.insert(enemy)
 
     def respawnPlayer(self, player, clear_scores=False):
         """ Respawn player """
@@ -180,7 +245,7 @@ class Game():
         self.game_over_y = 416 + 40
 
         self.game_over = True
-        self.globals.timer.add(3000, lambda: self.showScores(), 1)
+        self.globals.timer.add(3000, self.endLevel, 1)
 
     def gameOverScreen(self):
         """ Show game over screen """
@@ -201,6 +266,10 @@ class Game():
                     quit()
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_SPACE:
+                        # menu is not shared with the other side, network game ends here
+                        if self.netplay is not None:
+                            self.netplay.close()
+                            quit()
                         self.showMenu()
                         return
 
@@ -214,7 +283,7 @@ class Game():
         self.running = False
 
         # clear all timers
-        del self.globals.timer.timers[:]
+        self.globals.timer.clear()
 
         # set current stage to 0
         self.stage = 1
@@ -279,6 +348,7 @@ class Game():
         for player in self.globals.players:
             player.level = self.level
             self.respawnPlayer(player, True)
+            self.globals.spatial_tanks.insert(player)
 
     def showScores(self):
         """ Show level scores """
@@ -287,7 +357,7 @@ class Game():
         self.running = False
 
         # clear all timers
-        del self.globals.timer.timers[:]
+        self.globals.timer.clear()
 
         if self.globals.play_sounds:
             for sound in self.globals.sounds:
@@ -323,21 +393,21 @@ class Game():
         purple = pygame.Color(127, 64, 64)
         pink = pygame.Color(191, 160, 128)
 
-        self.globals.screen.blit(self.font.render("HI-SCORE", False, purple), [105, 35])
-        self.globals.screen.blit(self.font.render(str(hiscore), False, pink), [295, 35])
+        self.globals.screen.blit(self.globals.text.render(self.font, "HI-SCORE", False, purple), [105, 35])
+        self.globals.screen.blit(self.globals.text.render(self.font, str(hiscore), False, pink), [295, 35])
 
-        self.globals.screen.blit(self.font.render("STAGE" + str(self.stage).rjust(3), False, white), [170, 65])
+        self.globals.screen.blit(self.globals.text.render(self.font, "STAGE" + str(self.stage).rjust(3), False, white), [170, 65])
 
-        self.globals.screen.blit(self.font.render("I-PLAYER", False, purple), [25, 95])
+        self.globals.screen.blit(self.globals.text.render(self.font, "I-PLAYER", False, purple), [25, 95])
 
         # player 1 global score
-        self.globals.screen.blit(self.font.render(str(self.globals.players[0].score).rjust(8), False, pink), [25, 125])
+        self.globals.screen.blit(self.globals.text.render(self.font, str(self.globals.players[0].score).rjust(8), False, pink), [25, 125])
 
         if self.nr_of_players == 2:
-            self.globals.screen.blit(self.font.render("II-PLAYER", False, purple), [310, 95])
+            self.globals.screen.blit(self.globals.text.render(self.font, "II-PLAYER", False, purple), [310, 95])
 
             # player 2 global score
-            self.globals.screen.blit(self.font.render(str(self.globals.players[1].score).rjust(8), False, pink),
+            self.globals.screen.blit(self.globals.text.render(self.font, str(self.globals.players[1].score).rjust(8), False, pink),
                                      [325, 125])
 
         # tanks and arrows
@@ -347,7 +417,7 @@ class Game():
             if self.nr_of_players == 2:
                 self.globals.screen.blit(img_arrows[1], [258, 168 + (i * 45)])
 
-        self.globals.screen.blit(self.font.render("TOTAL", False, white), [70, 335])
+        self.globals.screen.blit(self.globals.text.render(self.font, "TOTAL", False, white), [70, 335])
 
         # total underline
         pygame.draw.line(self.globals.screen, white, [170, 330], [307, 330], 4)
@@ -369,14 +439,14 @@ class Game():
                     self.globals.sounds["score"].play()
 
                 # erase previous text
-                self.globals.screen.blit(self.font.render(str(n - 1).rjust(2), False, black), [170, 168 + (i * 45)])
+                self.globals.screen.blit(self.globals.text.render(self.font, str(n - 1).rjust(2), False, black), [170, 168 + (i * 45)])
                 # print new number of enemies
-                self.globals.screen.blit(self.font.render(str(n).rjust(2), False, white), [170, 168 + (i * 45)])
+                self.globals.screen.blit(self.globals.text.render(self.font, str(n).rjust(2), False, white), [170, 168 + (i * 45)])
                 # erase previous text
-                self.globals.screen.blit(self.font.render(str((n - 1) * (i + 1) * 100).rjust(4) + " PTS", False, black),
+                self.globals.screen.blit(self.globals.text.render(self.font, str((n - 1) * (i + 1) * 100).rjust(4) + " PTS", False, black),
                                          [25, 168 + (i * 45)])
                 # print new total points per enemy
-                self.globals.screen.blit(self.font.render(str(n * (i + 1) * 100).rjust(4) + " PTS", False, white),
+                self.globals.screen.blit(self.globals.text.render(self.font, str(n * (i + 1) * 100).rjust(4) + " PTS", False, white),
                                          [25, 168 + (i * 45)])
                 pygame.display.flip()
                 self.clock.tick(interval)
@@ -389,13 +459,13 @@ class Game():
                     if n > 0 and self.globals.play_sounds:
                         self.globals.sounds["score"].play()
 
-                    self.globals.screen.blit(self.font.render(str(n - 1).rjust(2), False, black), [277, 168 + (i * 45)])
-                    self.globals.screen.blit(self.font.render(str(n).rjust(2), False, white), [277, 168 + (i * 45)])
+                    self.globals.screen.blit(self.globals.text.render(self.font, str(n - 1).rjust(2), False, black), [277, 168 + (i * 45)])
+                    self.globals.screen.blit(self.globals.text.render(self.font, str(n).rjust(2), False, white), [277, 168 + (i * 45)])
 
                     self.globals.screen.blit(
-                        self.font.render(str((n - 1) * (i + 1) * 100).rjust(4) + " PTS", False, black),
+                        self.globals.text.render(self.font, str((n - 1) * (i + 1) * 100).rjust(4) + " PTS", False, black),
                         [325, 168 + (i * 45)])
-                    self.globals.screen.blit(self.font.render(str(n * (i + 1) * 100).rjust(4) + " PTS", False, white),
+                    self.globals.screen.blit(self.globals.text.render(self.font, str(n * (i + 1) * 100).rjust(4) + " PTS", False, white),
                                              [325, 168 + (i * 45)])
 
                     pygame.display.flip()
@@ -405,11 +475,11 @@ class Game():
 
         # total tanks
         tanks = sum([i for i in self.globals.players[0].trophies.values()]) - self.globals.players[0].trophies["bonus"]
-        self.globals.screen.blit(self.font.render(str(tanks).rjust(2), False, white), [170, 335])
+        self.globals.screen.blit(self.globals.text.render(self.font, str(tanks).rjust(2), False, white), [170, 335])
         if self.nr_of_players == 2:
             tanks = sum([i for i in self.globals.players[1].trophies.values()]) - self.globals.players[1].trophies[
                 "bonus"]
-            self.globals.screen.blit(self.font.render(str(tanks).rjust(2), False, white), [277, 335])
+            self.globals.screen.blit(self.globals.text.render(self.font, str(tanks).rjust(2), False, white), [277, 335])
 
         pygame.display.flip()
 
@@ -426,51 +496,91 @@ class Game():
 
         self.globals.screen.fill([0, 0, 0])
 
-        self.level.draw([self.level.TILE_EMPTY, self.level.TILE_BRICK, self.level.TILE_STEEL, self.level.TILE_FROZE,
-                         self.level.TILE_WATER])
+        # screen areas drawn to in this frame
+        drawn = self.level.draw([self.level.TILE_EMPTY, self.level.TILE_BRICK, self.level.TILE_STEEL,
+                                 self.level.TILE_FROZE, self.level.TILE_WATER])
 
-        self.globals.castle.draw()
+        drawn.append(self.globals.castle.draw())
 
         for enemy in self.globals.enemies:
-            enemy.draw()
+            drawn.append(enemy.draw())
 
         for label in self.globals.labels:
-            label.draw()
+            drawn.append(label.draw())
 
         for player in self.globals.players:
-            player.draw()
+            drawn.append(player.draw())
 
         for bullet in self.globals.bullets:
-            bullet.draw()
+            drawn.append(bullet.draw())
 
         for bonus in self.globals.bonuses:
-            bonus.draw()
+            drawn.append(bonus.draw())
 
         self.level.draw([self.level.TILE_GRASS])
 
         if self.game_over:
             if self.game_over_y > 188:
                 self.game_over_y -= 4
-            self.globals.screen.blit(self.im_game_over, [176, self.game_over_y])  # 176=(416-64)/2
+            drawn.append(self.globals.screen.blit(self.im_game_over, [176, self.game_over_y]))  # 176=(416-64)/2
 
-        self.drawSidebar()
+        drawn.append(self.drawSidebar())
 
-        pygame.display.flip()
+        if self.profiler is not None and self.profiler.overlay:
+            drawn.append(self.profiler.draw(self.globals.screen, self.globals.text, self.globals.text.font("Courier", 12, True)))
+
+        self.present([rect for rect in drawn if rect])
+
+    def present(self, drawn):
+        """ Put drawn frame on display
+		Unless whole screen has to be redrawn, update only areas that were drawn to in this
+		or previous frame: that covers everything that moved, appeared or disappeared
+		@param list drawn Rects drawn to in this frame
+		@return None
+		"""
+        if self.headless:
+            # nothing to put frame on, screen surface holds it
+            self.full_redraw = False
+        elif self.full_redraw or not self.dirty_rendering:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(drawn + self.drawn_rects)
+        self.drawn_rects = drawn
 
     def drawSidebar(self):
+        """ Draw sidebar
+		Sidebar is rendered into sidebar_layer only when enemy count, lives or stage change
+		@return pygame.Rect Sidebar area if anything on it has changed, otherwise None
+		"""
+
+        state = (len(self.level.enemies_left) + len(self.globals.enemies), [player.lives for player in self.globals.players], self.stage)
+        changed = state != self.sidebar_state
+        if changed:
+            self.sidebar_state = state
+            self.renderSidebar()
+
+        self.globals.screen.blit(self.sidebar_layer, [416, 0])
+        if changed:
+            return pygame.Rect([416, 0], [64, 416])
+        return None
+
+    def renderSidebar(self):
+        """ Render enemy count, players' lives and stage number into sidebar_layer
+		@return None
+		"""
 
-        x = 416
-        y = 0
-        self.globals.screen.fill([100, 100, 100], pygame.Rect([416, 0], [64, 416]))
+        layer = self.sidebar_layer
+        layer.fill([100, 100, 100])
 
-        xpos = x + 16
-        ypos = y + 16
+        xpos = 16
+        ypos = 16
 
         # draw enemy lives
         for n in range(len(self.level.enemies_left) + len(self.globals.enemies)):
-            self.globals.screen.blit(self.enemy_life_image, [xpos, ypos])
+            layer.blit(self.enemy_life_image, [xpos, ypos])
             if n % 2 == 1:
-                xpos = x + 16
+                xpos = 16
                 ypos += 17
             else:
                 xpos += 17
@@ -479,19 +589,13 @@ class Game():
         if pygame.font.get_init():
             text_color = pygame.Color('black')
             for n in range(len(self.globals.players)):
-                if n == 0:
-                    self.globals.screen.blit(self.font.render(str(n + 1) + "P", False, text_color), [x + 16, y + 200])
-                    self.globals.screen.blit(self.font.render(str(self.globals.players[n].lives), False, text_color),
-                                             [x + 31, y + 215])
-                    self.globals.screen.blit(self.player_life_image, [x + 17, y + 215])
-                else:
-                    self.globals.screen.blit(self.font.render(str(n + 1) + "P", False, text_color), [x + 16, y + 240])
-                    self.globals.screen.blit(self.font.render(str(self.globals.players[n].lives), False, text_color),
-                                             [x + 31, y + 255])
-                    self.globals.screen.blit(self.player_life_image, [x + 17, y + 255])
-
-            self.globals.screen.blit(self.flag_image, [x + 17, y + 280])
-            self.globals.screen.blit(self.font.render(str(self.stage), False, text_color), [x + 17, y + 312])
+                y = 200 if n == 0 else 240
+                layer.blit(self.globals.text.render(self.font, str(n + 1) + "P", False, text_color), [16, y])
+                layer.blit(self.globals.text.render(self.font, str(self.globals.players[n].lives), False, text_color), [31, y + 15])
+                layer.blit(self.player_life_image, [17, y + 15])
+
+            layer.blit(self.flag_image, [17, 280])
+            layer.blit(self.globals.text.render(self.font, str(self.stage), False, text_color), [17, 312])
 
     def drawIntroScreen(self, put_on_surface=True):
         """ Draw intro (menu) screen
@@ -504,14 +608,14 @@ class Game():
         if pygame.font.get_init():
             hiscore = self.loadHiscore()
 
-            self.globals.screen.blit(self.font.render("HI- " + str(hiscore), True, pygame.Color('white')), [170, 35])
+            self.globals.screen.blit(self.globals.text.render(self.font, "HI- " + str(hiscore), True, pygame.Color('white')), [170, 35])
 
-            self.globals.screen.blit(self.font.render("1 PLAYER", True, pygame.Color('white')), [165, 250])
-            self.globals.screen.blit(self.font.render("2 PLAYERS", True, pygame.Color('white')), [165, 275])
+            self.globals.screen.blit(self.globals.text.render(self.font, "1 PLAYER", True, pygame.Color('white')), [165, 250])
+            self.globals.screen.blit(self.globals.text.render(self.font, "2 PLAYERS", True, pygame.Color('white')), [165, 275])
 
-            self.globals.screen.blit(self.font.render("(c) 1980 1985 NAMCO LTD.", True, pygame.Color('white')),
+            self.globals.screen.blit(self.globals.text.render(self.font, "(c) 1980 1985 NAMCO LTD.", True, pygame.Color('white')),
                                      [50, 350])
-            self.globals.screen.blit(self.font.render("ALL RIGHTS RESERVED", True, pygame.Color('white')), [85, 380])
+            self.globals.screen.blit(self.globals.text.render(self.font, "ALL RIGHTS RESERVED", True, pygame.Color('white')), [85, 380])
 
         if self.nr_of_players == 1:
             self.globals.screen.blit(self.player_image, [125, 245])
@@ -668,22 +772,64 @@ class Game():
             self.globals.sounds["bg"].stop()
 
         self.active = False
-        self.globals.timer.add(3000, lambda: self.showScores(), 1)
+        self.globals.timer.add(3000, self.endLevel, 1)
 
         print("Stage " + str(self.stage) + " completed")
 
-    def nextLevel(self):
-        """ Start next level """
+    def endLevel(self):
+        """ Stop main loop of current level """
+        self.running = False
+
+    def checksum(self):
+        """ Checksum of world state, equal for games that have played the same way
+		@return int
+		"""
+        globals = self.globals
+        state = (
+            self.ticks, globals.castle.active, globals.timer.time, globals.rng.getstate(),
+            [(player.rect.topleft, player.direction, player.state, player.lives, player.score) for player in globals.players],
+            [(enemy.rect.topleft, enemy.direction, enemy.state, enemy.type, enemy.health) for enemy in globals.enemies],
+            [(bullet.rect.topleft, bullet.state) for bullet in globals.bullets],
+            [(bonus.rect.topleft, bonus.bonus) for bonus in globals.bonuses],
+        )
+        return zlib.crc32(repr(state).encode(), zlib.crc32(self.level.grid.tobytes()))
+
+    def simulate(self, stage=1, max_ticks=None, seed=None):
+        """ Play single stage without showing any screens before or after it
+		Nobody controls the players, so usually stage ends when castle gets destroyed
+		@param int stage Stage number
+		@param int max_ticks Stop after this many ticks. If None, play until stage ends
+		@param int seed Random seed. Same seed and stage always play out the same way
+		@return int Number of simulated ticks
+		"""
+        del self.globals.players[:]
+        self.stage = stage - 1
+        self.max_ticks = max_ticks
+        self.nextLevel(seed)
+        return self.ticks
+
+    def startLevel(self, seed=None):
+        """ Load next stage and reset world for it
+		@param int seed If not None, reseed random generator before loading stage
+		@return None
+		"""
+
+        if seed is not None:
+            self.globals.rng.seed(seed)
 
         del self.globals.bullets[:]
         del self.globals.enemies[:]
         del self.globals.bonuses[:]
+        self.globals.spatial_tanks.clear()
+        self.globals.spatial_bullets.clear()
+        self.globals.bullet_system.clear(self.globals.env_index)
+        self.globals.spatial_bonuses.clear()
         self.globals.castle.rebuild()
-        del self.globals.timer.timers[:]
+        self.globals.timer.clear()
 
         # load level
         self.stage += 1
-        self.level = Level(self.stage, self.globals)
+        self.level = self.level_cache.level(self.stage, self.globals, self.grid)
         self.timefreeze = False
 
         # set number of enemies by types (basic, fast, power, armor) according to level
@@ -703,15 +849,15 @@ class Game():
             enemies_l = levels_enemies[34]
 
         self.level.enemies_left = [0] * enemies_l[0] + [1] * enemies_l[1] + [2] * enemies_l[2] + [3] * enemies_l[3]
-        random.shuffle(self.level.enemies_left)
+        self.globals.rng.shuffle(self.level.enemies_left)
 
         if self.globals.play_sounds:
             self.globals.sounds["start"].play()
-            self.globals.timer.add(4330, lambda: self.globals.sounds["bg"].play(-1), 1)
+            self.globals.timer.add(4330, self.globals.sounds["bg"].play, 1, (-1,))
 
         self.reloadPlayers()
 
-        self.globals.timer.add(3000, lambda: self.spawnEnemy())
+        self.globals.timer.add(3000, self.spawnEnemy)
 
         # if True, start "game over" animation
         self.game_over = False
@@ -722,144 +868,286 @@ class Game():
         # if False, players won't be able to do anything
         self.active = True
 
-        self.draw()
+        # number of ticks played in this stage
+        self.ticks = 0
+
+        # movement keys currently held down by each player (see readInputs)
+        self.held = [Inputs.NONE] * len(self.globals.players)
+
+        # screen was used by other screens in between
+        self.full_redraw = True
+        self.drawn_rects = []
+        self.sidebar_state = None
+
+    def nextLevel(self, seed=None):
+        """ Start next level """
+
+        # both sides of network game must play stage with the same seed
+        if seed is None and self.netplay is not None:
+            seed = self.netplay.stageSeed(self.stage + 1)
+
+        replay = None
+        if self.record_dir is not None:
+            if seed is None:
+                seed = random.getrandbits(32)
+            self.startLevel(seed)
+            replay = Replay.fromGame(self, seed)
+        else:
+            self.startLevel(seed)
+
+        for observer in self.observers:
+            observer()
 
         while self.running:
 
-            time_passed = self.clock.tick(50)
+            if not self.headless:
+                self.clock.tick(50)
 
-            for i in range(self.joycount):
-                joystick = self.joysticks[i]
-                joystick.translate_event()
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.begin()
 
-            for event in pygame.event.get():
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    pass
-                elif event.type == pygame.QUIT:
-                    quit()
-                elif event.type == pygame.KEYDOWN and not self.game_over and self.active:
+            inputs = self.readInputs()
+            if self.netplay is not None:
+                inputs = self.netplay.exchange(self, inputs)
+            if replay is not None:
+                replay.record(inputs)
+            self.step(inputs)
 
-                    if event.key == pygame.K_q:
-                        quit()
-                    # toggle sounds
-                    elif event.key == pygame.K_m:
-                        self.globals.play_sounds = not self.globals.play_sounds
-                        if not self.globals.play_sounds:
-                            pygame.mixer.stop()
+            for observer in self.observers:
+                observer()
+
+            if profiler is not None:
+                profiler.mark(profiler.DRAW)
+                profiler.end((len(self.globals.enemies), len(self.globals.bullets), len(self.globals.bonuses)))
+
+            if self.max_ticks is not None and self.ticks >= self.max_ticks:
+                self.running = False
+
+        if replay is not None:
+            replay.save(os.path.join(
+                self.record_dir, "stage%02d-%s.replay" % (self.stage, time.strftime("%Y%m%d-%H%M%S"))
+            ))
+
+        if not self.headless:
+            # load next stage while scores are shown, not when it starts
+            self.level_cache.template(self.stage + 1)
+            self.showScores()
+
+    def readInputs(self):
+        """ Turn pending keyboard and joystick events into players' inputs
+		@return list Inputs bit mask for every player
+		"""
+
+        pressed = [Inputs.NONE] * len(self.globals.players)
+
+        if self.headless:
+            return pressed
+
+        for i in range(self.joycount):
+            joystick = self.joysticks[i]
+            joystick.translate_event()
+
+        for event in pygame.event.get():
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                pass
+            elif event.type == pygame.QUIT:
+                quit()
+            elif event.type == pygame.VIDEOEXPOSE:
+                self.full_redraw = True
+            elif event.type == pygame.KEYDOWN:
+
+                if event.key == pygame.K_q:
+                    quit()
+                # toggle profiler overlay
+                elif event.key == pygame.K_F3 and self.profiler is not None:
+                    self.profiler.overlay = not self.profiler.overlay
+                    self.full_redraw = True
+                # toggle sounds
+                elif event.key == pygame.K_m and not self.game_over and self.active:
+                    self.globals.play_sounds = not self.globals.play_sounds
+                    if not self.globals.play_sounds:
+                        pygame.mixer.stop()
+                    else:
+                        self.globals.sounds["bg"].play(-1)
+
+                for i, player in enumerate(self.globals.players):
+                    if event.key in player.controls:
+                        key = 1 << player.controls.index(event.key)
+                        if key & Inputs.HELD:
+                            self.held[i] |= key
                         else:
-                            self.globals.sounds["bg"].play(-1)
-
-                    for player in self.globals.players:
-                        if player.state == player.STATE_ALIVE:
-                            try:
-                                index = player.controls.index(event.key)
-                            except:
-                                pass
-                            else:
-                                if index == 0:
-                                    if player.fire() and self.globals.play_sounds:
-                                        self.globals.sounds["fire"].play()
-                                elif index == 1:
-                                    player.pressed[0] = True
-                                elif index == 2:
-                                    player.pressed[1] = True
-                                elif index == 3:
-                                    player.pressed[2] = True
-                                elif index == 4:
-                                    player.pressed[3] = True
-                                elif index == 5:
-                                    if self.globals.tricks is not None and self.globals.tricks.helmet_me:
-                                        self.shieldPlayer(player, shield=True, duration=10000)
-                                elif index == 6:
-                                    if self.globals.tricks is not None and self.globals.tricks.freeze_enemy:
-                                        self.toggleEnemyFreeze(True)
-                                        self.globals.timer.add(10000, lambda: self.toggleEnemyFreeze(False), 1)
-                                elif index == 7:
-                                    if self.globals.tricks is not None and self.globals.tricks.fire_all:
-                                        if player.fire(allow_full_fire=True, all_direction=True) and self.globals.play_sounds:
-                                            self.globals.sounds["fire"].play()
-                                elif index == 8:
-                                    if self.globals.tricks is None:
-                                        self.globals.tricks = Tricks()
-                                        self.globals.castle.tricks = self.globals.tricks
-                                        for player in self.globals.players:
-                                            player.globals.tricks = self.globals.tricks
-                                            player.superpowers = self.globals.tricks.player_bullet_super_power
-                                            player.speed = self.globals.tricks.player_bullet_speed
-                                    else:
-                                        self.globals.tricks = None
-                                        self.globals.castle.tricks = None
-                                        for player in self.globals.players:
-                                            player.globals.tricks = None
-                elif event.type == pygame.KEYUP and not self.game_over and self.active:
-                    for player in self.globals.players:
-                        if player.state == player.STATE_ALIVE:
-                            try:
-                                index = player.controls.index(event.key)
-                            except:
-                                pass
-                            else:
-                                if index == 1:
-                                    player.pressed[0] = False
-                                elif index == 2:
-                                    player.pressed[1] = False
-                                elif index == 3:
-                                    player.pressed[2] = False
-                                elif index == 4:
-                                    player.pressed[3] = False
+                            pressed[i] |= key
+            elif event.type == pygame.KEYUP:
+                for i, player in enumerate(self.globals.players):
+                    if event.key in player.controls:
+                        self.held[i] &= ~(1 << player.controls.index(event.key))
+
+        return [held | keys for held, keys in zip(self.held, pressed)]
+
+    def step(self, inputs):
+        """ Advance game by one tick of self.TICK ms
+		Everything that happens in game happens here, so given the same random seed and
+		the same inputs game always plays out exactly the same way
+		@param list inputs Inputs bit mask for every player
+		@return None
+		"""
 
+        self.beginStep(inputs)
+        # bullet system may be shared with other games, see VectorEnvironment
+        self.globals.bullet_system.step(env=self.globals.env_index)
+        self.endStep()
+
+    def beginStep(self, inputs):
+        """ First part of step(), everything up to moving bullets
+		Games sharing one bullet system run it each, move bullets of all of them with a single
+		BulletSystem.step() and then run endStep() each
+		@param list inputs Inputs bit mask for every player
+		@return None
+		"""
+
+        profiler = self.profiler
+
+        self.applyInputs(inputs)
+        if profiler is not None:
+            profiler.mark(profiler.EVENTS)
+        self.updatePlayers()
+        if profiler is not None:
+            profiler.mark(profiler.PLAYERS)
+        self.updateEnemies()
+        if profiler is not None:
+            profiler.mark(profiler.ENEMIES)
+        self.dropBullets()
+
+    def endStep(self):
+        """ Second part of step(), everything after bullets have moved """
+
+        profiler = self.profiler
+
+        self.updateBullets()
+        if profiler is not None:
+            profiler.mark(profiler.BULLETS)
+
+        for bonus in self.globals.bonuses:
+            if bonus.active == False:
+                bonus.remove()
+
+        labels = self.globals.labels
+        for label in labels:
+            if not label.active:
+                self.globals.label_pool.release(label)
+        labels[:] = [label for label in labels if label.active]
+
+        if not self.game_over:
+            if not self.globals.castle.active:
+                self.gameOver()
+
+        self.globals.timer.update(self.TICK)
+        if profiler is not None:
+            profiler.mark(profiler.TIMERS)
+
+        self.ticks += 1
+
+    def applyInputs(self, inputs):
+        """ Apply players' inputs for this tick """
+
+        if self.game_over or not self.active:
+            return
+
+        for player, keys in zip(self.globals.players, inputs):
+            if player.state != player.STATE_ALIVE:
+                continue
+
+            player.pressed = [bool(keys & Inputs.UP), bool(keys & Inputs.RIGHT),
+                              bool(keys & Inputs.DOWN), bool(keys & Inputs.LEFT)]
+
+            if keys & Inputs.FIRE:
+                if player.fire() and self.globals.play_sounds:
+                    self.globals.sounds["fire"].play()
+            if keys & Inputs.HELMET:
+                if self.globals.tricks is not None and self.globals.tricks.helmet_me:
+                    self.shieldPlayer(player, shield=True, duration=10000)
+            if keys & Inputs.FREEZE:
+                if self.globals.tricks is not None and self.globals.tricks.freeze_enemy:
+                    self.toggleEnemyFreeze(True)
+                    self.globals.timer.add(10000, self.toggleEnemyFreeze, 1, (False,))
+            if keys & Inputs.FIRE_ALL:
+                if self.globals.tricks is not None and self.globals.tricks.fire_all:
+                    if player.fire(allow_full_fire=True, all_direction=True) and self.globals.play_sounds:
+                        self.globals.sounds["fire"].play()
+            if keys & Inputs.TOGGLE_TRICK:
+                self.toggleTricks()
+
+    def toggleTricks(self):
+        """ Turn tricks on/off """
+        if self.globals.tricks is None:
+            self.globals.tricks = Tricks()
+            self.globals.castle.tricks = self.globals.tricks
             for player in self.globals.players:
-                if player.state == player.STATE_ALIVE and not self.game_over and self.active:
-                    if player.pressed[0] == True:
-                        player.move(self.DIR_UP);
-                    elif player.pressed[1] == True:
-                        player.move(self.DIR_RIGHT);
-                    elif player.pressed[2] == True:
-                        player.move(self.DIR_DOWN);
-                    elif player.pressed[3] == True:
-                        player.move(self.DIR_LEFT);
-                player.update(time_passed)
+                player.globals.tricks = self.globals.tricks
+                player.superpowers = self.globals.tricks.player_bullet_super_power
+                player.speed = self.globals.tricks.player_bullet_speed
+        else:
+            self.globals.tricks = None
+            self.globals.castle.tricks = None
+            for player in self.globals.players:
+                player.globals.tricks = None
 
-            for enemy in self.globals.enemies:
-                if enemy.state == enemy.STATE_DEAD and not self.game_over and self.active:
-                    self.globals.enemies.remove(enemy)
-                    if len(self.level.enemies_left) == 0 and len(self.globals.enemies) == 0:
-                        self.finishLevel()
-                else:
-                    enemy.update(time_passed)
-
-            if not self.game_over and self.active:
-                for player in self.globals.players:
-                    if player.state == player.STATE_ALIVE:
-                        if player.bonus != None and player.side == player.SIDE_PLAYER:
-                            self.triggerBonus(bonus, player)
-                            player.bonus = None
-                    elif player.state == player.STATE_DEAD:
-                        self.superpowers = 0
-                        player.lives -= 1
-                        if player.lives > 0:
-                            self.respawnPlayer(player)
-                        else:
-                            self.gameOver()
+    def updatePlayers(self):
+        """ Move players, hand out bonuses they have picked up and respawn dead ones """
 
-            for bullet in self.globals.bullets:
-                if bullet.state == bullet.STATE_REMOVED:
-                    self.globals.bullets.remove(bullet)
-                else:
-                    bullet.update()
+        for player in self.globals.players:
+            if player.state == player.STATE_ALIVE and not self.game_over and self.active:
+                if player.pressed[0] == True:
+                    player.move(self.DIR_UP);
+                elif player.pressed[1] == True:
+                    player.move(self.DIR_RIGHT);
+                elif player.pressed[2] == True:
+                    player.move(self.DIR_DOWN);
+                elif player.pressed[3] == True:
+                    player.move(self.DIR_LEFT);
+            player.update(self.TICK)
+
+        if not self.game_over and self.active:
+            for player in self.globals.players:
+                if player.state == player.STATE_ALIVE:
+                    if player.bonus != None and player.side == player.SIDE_PLAYER:
+                        self.triggerBonus(player.bonus, player)
+                        player.bonus = None
+                elif player.state == player.STATE_DEAD:
+                    self.superpowers = 0
+                    player.lives -= 1
+                    if player.lives > 0:
+                        self.respawnPlayer(player)
+                    else:
+                        self.gameOver()
+
+    def updateEnemies(self):
+        """ Move enemies and drop dead ones """
 
-            for bonus in self.globals.bonuses:
-                if bonus.active == False:
-                    self.globals.bonuses.remove(bonus)
+        for enemy in self.globals.enemies:
+            if enemy.state == enemy.STATE_DEAD and not self.game_over and self.active:
+                self.globals.enemies.remove(enemy)
+                self.globals.spatial_tanks.remove(enemy)
+                if len(self.level.enemies_left) == 0 and len(self.globals.enemies) == 0:
+                    self.finishLevel()
+            else:
+                enemy.update(self.TICK)
 
-            for label in self.globals.labels:
-                if not label.active:
-                    self.globals.labels.remove(label)
+    def dropBullets(self):
+        """ Drop removed bullets """
 
-            if not self.game_over:
-                if not self.globals.castle.active:
-                    self.gameOver()
+        bullets = self.globals.bullets
+        removed = [bullet for bullet in bullets if bullet.state == bullet.STATE_REMOVED]
+        if removed:
+            for bullet in removed:
+                self.globals.spatial_bullets.remove(bullet)
+                self.globals.bullet_system.remove(bullet.slot)
+                self.globals.bullet_pool.release(bullet)
+            bullets[:] = [bullet for bullet in bullets if bullet.state != bullet.STATE_REMOVED]
 
-            self.globals.timer.update(time_passed)
+    def updateBullets(self):
+        """ Let each bullet handle its collisions, after bullet system has moved them all """
 
-            self.draw()
+        for bullet in self.globals.bullets:
+            bullet.update()
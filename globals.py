@@ -1,10 +1,19 @@
+import random
+
+from bullet import Bullet
+from bulletsystem import BulletSystem
 from castle import Castle
+from explosion import Explosion
+from label import Label
+from pool import Pool
+from spatialhash import SpatialHash
+from textcache import TextCache
 from timer import Timer
 from tricks import Tricks
 
 
 class Globals():
-    def __init__(self, tricks: Tricks, timer:Timer, sprites, screen, players, enemies, bullets, bonuses, labels, castle:Castle, play_sounds:bool, sounds):
+    def __init__(self, tricks: Tricks, timer:Timer, sprites, screen, players, enemies, bullets, bonuses, labels, castle:Castle, play_sounds:bool, sounds, rng:random.Random=None):
         self.tricks = tricks
         self.timer = timer
 
@@ -17,5 +26,33 @@ class Globals():
         self.labels = labels
         self.castle = castle
 
+        # shared images, see SpriteAtlas
+        self.atlas = None
+
+        # LevelPack to load levels from, None - read files in levels directory
+        self.level_pack = None
+
+        # rendered text and fonts
+        self.text = TextCache()
+
+        # positions and motion of all bullets
+        self.bullet_system = BulletSystem()
+
+        # index of this game among games sharing bullet_system, see VectorEnvironment
+        self.env_index = 0
+
+        # recycled short-lived objects, see Pool.stats() for hit rates
+        self.bullet_pool = Pool(Bullet)
+        self.explosion_pool = Pool(Explosion)
+        self.label_pool = Pool(Label)
+
+        # broad phase collision lookup, must be kept in sync with lists above
+        self.spatial_tanks = SpatialHash()
+        self.spatial_bullets = SpatialHash()
+        self.spatial_bonuses = SpatialHash()
+
         self.play_sounds = play_sounds
         self.sounds = sounds
+
+        # every random decision in game goes through this, so seeding it makes game reproducible
+        self.rng = rng if rng is not None else random.Random()
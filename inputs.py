@@ -0,0 +1,15 @@
+class Inputs():
+    """ Input state of a single player during one tick, packed into an int
+
+    Bit n is set when key n of Tank.controls is pressed. Movement bits stay set for as
+    long as the key is held down, all the others are set only on the tick when the key
+    went down.
+    """
+
+    (FIRE, UP, RIGHT, DOWN, LEFT, HELMET, FREEZE, FIRE_ALL, TOGGLE_TRICK) = [1 << n for n in range(9)]
+
+    # keys that keep acting while being held down
+    HELD = UP | RIGHT | DOWN | LEFT
+
+    # no key pressed
+    NONE = 0
@@ -1,8 +1,9 @@
-import pygame
-
-
 class Label():
 	def __init__(self, position, text = "", duration = None, globals = None):
+		self.reset(position, text, duration, globals)
+
+	def reset(self, position, text = "", duration = None, globals = None):
+		""" (Re)initialize label, called also when label is reused from pool """
 
 		self.globals = globals
 
@@ -12,14 +13,16 @@ class Label():
 
 		self.text = text
 
-		self.font = pygame.font.SysFont("Arial", 13)
+		self.font = self.globals.text.font("Arial", 13, True)
 
 		if duration != None:
-			self.globals.timer.add(duration, lambda :self.destroy(), 1)
+			self.globals.timer.add(duration, self.destroy, 1)
 
 	def draw(self):
-		""" draw label """
-		self.globals.screen.blit(self.font.render(self.text, False, (200,200,200)), [self.position[0]+4, self.position[1]+8])
+		""" draw label
+		@return pygame.Rect Screen area drawn to
+		"""
+		return self.globals.screen.blit(self.globals.text.render(self.font, self.text, False, (200,200,200)), [self.position[0]+4, self.position[1]+8])
 
 	def destroy(self):
 		self.active = False
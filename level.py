@@ -1,7 +1,9 @@
 import os
 
+import numpy as np
 import pygame
 
+from flowfield import FlowField
 from myRect import myRect
 
 
@@ -12,9 +14,18 @@ class Level():
     # tile width/height in px
     TILE_SIZE = 16
 
-    def __init__(self, level_nr=None, globals=None):
+    # map width/height in tiles
+    MAP_SIZE = 26
+
+    # level file characters for each tile type
+    TILE_CHARS = {"#": TILE_BRICK, "@": TILE_STEEL, "~": TILE_WATER, "%": TILE_GRASS, "-": TILE_FROZE}
+
+    def __init__(self, level_nr=None, globals=None, template=None, grid=None):
         """ There are total 35 different levels. If level_nr is larger than 35, loop over
-		to next according level so, for example, if level_nr ir 37, then load level 2 """
+		to next according level so, for example, if level_nr ir 37, then load level 2
+		@param Level template Copy map from this level instead of loading it, see LevelCache
+		@param numpy.ndarray grid Array to keep tile types in, e.g. a slice of grids of several
+			games stacked together. None - level gets its own """
 
         self.globals = globals
         # max number of enemies simultaneously  being on map
@@ -22,16 +33,7 @@ class Level():
         if self.globals.tricks is not None:
             self.max_active_enemies = self.globals.tricks.max_active_enemies
 
-        tile_images = [
-            pygame.Surface((8 * 2, 8 * 2)),
-            globals.sprites.subsurface(48 * 2, 64 * 2, 8 * 2, 8 * 2),
-            globals.sprites.subsurface(48 * 2, 72 * 2, 8 * 2, 8 * 2),
-            globals.sprites.subsurface(56 * 2, 72 * 2, 8 * 2, 8 * 2),
-            globals.sprites.subsurface(64 * 2, 64 * 2, 8 * 2, 8 * 2),
-            globals.sprites.subsurface(64 * 2, 64 * 2, 8 * 2, 8 * 2),
-            globals.sprites.subsurface(72 * 2, 64 * 2, 8 * 2, 8 * 2),
-            globals.sprites.subsurface(64 * 2, 72 * 2, 8 * 2, 8 * 2)
-        ]
+        tile_images = globals.atlas.tiles
         self.tile_empty = tile_images[0]
         self.tile_brick = tile_images[1]
         self.tile_steel = tile_images[2]
@@ -41,21 +43,155 @@ class Level():
         self.tile_water2 = tile_images[5]
         self.tile_froze = tile_images[6]
 
-        self.obstacle_rects = []
+        # tile type of every map cell, indexed [row, column]
+        if grid is None:
+            grid = np.zeros((self.MAP_SIZE, self.MAP_SIZE), dtype=np.uint8)
+        self.grid = grid
 
-        level_nr = 1 if level_nr == None else level_nr % 35
-        if level_nr == 0:
-            level_nr = 35
+        # one int per map row, bit n is set if tile in column n is an obstacle
+        # (tanks cannot move over it and bullets cannot fly through it)
+        self.obstacle_rows = [0] * self.MAP_SIZE
 
-        self.loadLevel(level_nr)
+        # cached myRect views of the grid, built on demand (see mapr and obstacle_rects)
+        self._mapr = None
+        self._obstacle_rects = None
 
-        # tiles' rects on map, tanks cannot move over
-        self.obstacle_rects = []
+        # pre-rendered terrain, built on first draw (see initLayers)
+        self.layer_ground = None
+        self.layer_grass = None
+        self.grass_rect = None
+        self.water_frames = None
+        self.water_rect = None
 
-        # update these tiles
-        self.updateObstacleRects()
+        # enemies' way to castle, kept up to date by setTile()
+        self.flow_field = None
+
+        # cells changed since layers were last rendered
+        self.dirty_tiles = []
+
+        # water animation frame drawn last time
+        self.water_frame = 0
+
+        if template is not None:
+            self.copyMap(template)
+        else:
+            level_nr = self.levelNumber(1 if level_nr == None else level_nr, globals.level_pack)
+            if not self.loadLevel(level_nr):
+                raise ValueError("level %d does not exist" % level_nr)
+
+        self.timer_uuid_waves = globals.timer.add(400, self.toggleWaves)
+
+    @property
+    def mapr(self):
+        """ All non-empty tiles as list of myRect """
+        if self._mapr is None:
+            self._mapr = [
+                myRect(col * self.TILE_SIZE, row * self.TILE_SIZE, self.TILE_SIZE, self.TILE_SIZE, int(self.grid[row, col]))
+                for row, col in zip(*np.nonzero(self.grid))
+            ]
+        return self._mapr
+
+    @property
+    def obstacle_rects(self):
+        """ Castle's and all tiles' rects that players can destroy with bullets """
+        if self._obstacle_rects is None:
+            self._obstacle_rects = [self.globals.castle.rect] + [
+                tile for tile in self.mapr if tile.type in (self.TILE_BRICK, self.TILE_STEEL)
+            ]
+        return self._obstacle_rects
+
+    def setTile(self, row, col, tile):
+        """ Change single map cell
+		@param int tile Tile type
+		@return None
+		"""
+        if self.layer_ground is not None:
+            self.dirty_tiles.append((row, col, self.grid[row, col]))
+        self.grid[row, col] = tile
+        if tile in (self.TILE_BRICK, self.TILE_STEEL):
+            self.obstacle_rows[row] |= 1 << col
+        else:
+            self.obstacle_rows[row] &= ~(1 << col)
+        self._mapr = None
+        self._obstacle_rects = None
+        if self.flow_field is not None:
+            self.flow_field.tileChanged(row, col)
+
+    def tileRange(self, rect):
+        """ Map cells rect overlaps with
+		@return tuple first row, last row + 1, first column, last column + 1
+		"""
+        row0 = rect.top // self.TILE_SIZE
+        col0 = rect.left // self.TILE_SIZE
+        return (
+            row0 if row0 > 0 else 0,
+            (rect.bottom - 1) // self.TILE_SIZE + 1,
+            col0 if col0 > 0 else 0,
+            (rect.right - 1) // self.TILE_SIZE + 1
+        )
+
+    def collideObstacles(self, rect):
+        """ Whether rect overlaps castle or any tile tanks cannot move over """
+        if rect.colliderect(self.globals.castle.rect):
+            return True
+        row0, row1, col0, col1 = self.tileRange(rect)
+        if col1 <= col0:
+            return False
+        mask = (1 << col1) - (1 << col0)
+        for bits in self.obstacle_rows[row0:row1]:
+            if bits & mask:
+                return True
+        return False
+
+    def sweepObstacles(self, rect, dx, dy):
+        """ Walk map cells swept by rect moving along one axis, in order of movement
+		Cells are visited row by row (column by column when moving horizontally) from
+		where rect was before the move to where it is now, so fast bullets cannot pass
+		through thin walls
+		@param pygame.Rect rect Position after the move
+		@param int dx Horizontal movement in px
+		@param int dy Vertical movement in px
+		@return list Top left corners (in px) of obstacle tiles in the first row or column
+			that has any, empty list if the way was clear
+		"""
+        size = self.TILE_SIZE
+        last = self.MAP_SIZE - 1
+        tiles = []
 
-        globals.timer.add(400, lambda: self.toggleWaves())
+        if dx == 0:
+            # moving vertically: rows in order of movement, columns rect spans
+            col0 = max(rect.left // size, 0)
+            col1 = min((rect.right - 1) // size, last)
+            if col1 < col0:
+                return tiles
+            mask = (1 << (col1 + 1)) - (1 << col0)
+            if dy < 0:
+                rows = range(min((rect.bottom - 1 - dy) // size, last), max(rect.top // size, 0) - 1, -1)
+            else:
+                rows = range(max((rect.top - dy) // size, 0), min((rect.bottom - 1) // size, last) + 1)
+            for row in rows:
+                bits = self.obstacle_rows[row] & mask
+                if bits:
+                    for col in range(col0, col1 + 1):
+                        if bits >> col & 1:
+                            tiles.append((col * size, row * size))
+                    return tiles
+        else:
+            # moving horizontally: columns in order of movement, rows rect spans
+            row0 = max(rect.top // size, 0)
+            row1 = min((rect.bottom - 1) // size, last)
+            if dx < 0:
+                cols = range(min((rect.right - 1 - dx) // size, last), max(rect.left // size, 0) - 1, -1)
+            else:
+                cols = range(max((rect.left - dx) // size, 0), min((rect.right - 1) // size, last) + 1)
+            rows = self.obstacle_rows
+            for col in cols:
+                for row in range(row0, row1 + 1):
+                    if rows[row] >> col & 1:
+                        tiles.append((col * size, row * size))
+                if tiles:
+                    return tiles
+        return tiles
 
     def hitTile(self, pos, power=1, sound=False):
         """
@@ -64,23 +200,25 @@ class Level():
 			@return True if bullet was stopped, False otherwise
 		"""
 
-        for tile in self.mapr:
-            if tile.topleft == pos:
-                if tile.type == self.TILE_BRICK:
-                    if self.globals.play_sounds and sound:
-                        self.globals.sounds["brick"].play()
-                    self.mapr.remove(tile)
-                    self.updateObstacleRects()
-                    return True
-                elif tile.type == self.TILE_STEEL:
-                    if self.globals.play_sounds and sound:
-                        self.globals.sounds["steel"].play()
-                    if power == 2:
-                        self.mapr.remove(tile)
-                        self.updateObstacleRects()
-                    return True
-                else:
-                    return False
+        row = pos[1] // self.TILE_SIZE
+        col = pos[0] // self.TILE_SIZE
+        if not (0 <= row < self.MAP_SIZE and 0 <= col < self.MAP_SIZE):
+            return False
+
+        tile = self.grid[row, col]
+        if tile == self.TILE_BRICK:
+            if self.globals.play_sounds and sound:
+                self.globals.sounds["brick"].play()
+            self.setTile(row, col, self.TILE_EMPTY)
+            return True
+        elif tile == self.TILE_STEEL:
+            if self.globals.play_sounds and sound:
+                self.globals.sounds["steel"].play()
+            if power == 2:
+                self.setTile(row, col, self.TILE_EMPTY)
+            return True
+        else:
+            return False
 
     def toggleWaves(self):
         """ Toggle water image """
@@ -89,64 +227,199 @@ class Level():
         else:
             self.tile_water = self.tile_water1
 
+    @staticmethod
+    def levelNumber(stage, level_pack=None):
+        """ Number of level played at stage
+		@param int stage Stage number, 1 and up
+		@param LevelPack level_pack Pack levels come from, None - level files
+		@return int
+		"""
+        if level_pack is None:
+            level_nr = stage % 35
+            return 35 if level_nr == 0 else level_nr
+        # stages loop over levels of the pack in order, whatever their numbers are
+        return int(level_pack.numbers[(stage - 1) % len(level_pack)])
+
+    @classmethod
+    def parseLevel(cls, text):
+        """ Tile types of level file contents
+		@param string text One line per map row, one character per tile
+		@return numpy.ndarray Array of shape (MAP_SIZE, MAP_SIZE)
+		"""
+        grid = np.full((cls.MAP_SIZE, cls.MAP_SIZE), cls.TILE_EMPTY, dtype=np.uint8)
+        for row, line in enumerate(text.split("\n")[:cls.MAP_SIZE]):
+            for col, ch in enumerate(line[:cls.MAP_SIZE]):
+                grid[row, col] = cls.TILE_CHARS.get(ch, cls.TILE_EMPTY)
+        return grid
+
     def loadLevel(self, level_nr=1):
-        """ Load specified level
+        """ Load specified level, from level pack if there is one
 		@return boolean Whether level was loaded
 		"""
-        filename = "levels/" + str(level_nr)
-        if (not os.path.isfile(filename)):
-            return False
-        level = []
-        f = open(filename, "r")
-        data = f.read().split("\n")
-        self.mapr = []
-        x, y = 0, 0
-        for row in data:
-            for ch in row:
-                if ch == "#":
-                    self.mapr.append(myRect(x, y, self.TILE_SIZE, self.TILE_SIZE, self.TILE_BRICK))
-                elif ch == "@":
-                    self.mapr.append(myRect(x, y, self.TILE_SIZE, self.TILE_SIZE, self.TILE_STEEL))
-                elif ch == "~":
-                    self.mapr.append(myRect(x, y, self.TILE_SIZE, self.TILE_SIZE, self.TILE_WATER))
-                elif ch == "%":
-                    self.mapr.append(myRect(x, y, self.TILE_SIZE, self.TILE_SIZE, self.TILE_GRASS))
-                elif ch == "-":
-                    self.mapr.append(myRect(x, y, self.TILE_SIZE, self.TILE_SIZE, self.TILE_FROZE))
-                x += self.TILE_SIZE
-            x = 0
-            y += self.TILE_SIZE
+        if self.globals.level_pack is not None:
+            tiles = self.globals.level_pack.tiles(level_nr)
+            if tiles is None:
+                return False
+            self.grid[:] = tiles
+        else:
+            filename = "levels/" + str(level_nr)
+            if (not os.path.isfile(filename)):
+                return False
+            f = open(filename, "r")
+            self.grid[:] = self.parseLevel(f.read())
+            f.close()
+        self.updateObstacleRects()
+        self.flow_field = FlowField(self, self.globals.castle.rect)
+        self.layer_ground = None
         return True
 
+    def copyMap(self, template):
+        """ Take over map and pre-rendered layers of another level
+		Level is left independent of template, destroying its tiles does not change template
+		@param Level template
+		@return None
+		"""
+        self.grid[:] = template.grid
+        self.obstacle_rows = list(template.obstacle_rows)
+        self.flow_field = template.flow_field.copy(self)
+        if template.layer_ground is not None:
+            self.layer_ground = template.layer_ground.copy()
+            self.layer_grass = template.layer_grass.copy()
+            self.grass_rect = template.grass_rect
+            # initWater() replaces frames instead of drawing onto them, they can be shared
+            self.water_frames = template.water_frames
+            self.water_rect = template.water_rect
+
     def draw(self, tiles=None):
-        """ Draw specified map on top of existing surface """
+        """ Draw specified map on top of existing surface
+		Brick, steel and ice are pre-rendered together into one opaque layer, so asking
+		for any of them draws all three
+		@return list Rects of map that look different than on previous draw
+		"""
 
         if tiles == None:
             tiles = [self.TILE_BRICK, self.TILE_STEEL, self.TILE_WATER, self.TILE_GRASS, self.TILE_FROZE]
 
-        for tile in self.mapr:
-            if tile.type in tiles:
-                if tile.type == self.TILE_BRICK:
-                    self.globals.screen.blit(self.tile_brick, tile.topleft)
-                elif tile.type == self.TILE_STEEL:
-                    self.globals.screen.blit(self.tile_steel, tile.topleft)
-                elif tile.type == self.TILE_WATER:
-                    self.globals.screen.blit(self.tile_water, tile.topleft)
-                elif tile.type == self.TILE_FROZE:
-                    self.globals.screen.blit(self.tile_froze, tile.topleft)
-                elif tile.type == self.TILE_GRASS:
-                    self.globals.screen.blit(self.tile_grass, tile.topleft)
+        changed = []
 
-    def updateObstacleRects(self):
-        """ Set self.obstacle_rects to all tiles' rects that players can destroy
-		with bullets """
+        if self.layer_ground is None:
+            self.initLayers()
+            changed.append(self.layer_ground.get_rect())
+        elif self.dirty_tiles:
+            changed = self.redrawTiles()
+
+        screen = self.globals.screen
+
+        if self.TILE_BRICK in tiles or self.TILE_STEEL in tiles or self.TILE_FROZE in tiles:
+            screen.blit(self.layer_ground, (0, 0))
+
+        if self.TILE_WATER in tiles and self.water_rect is not None:
+            frame = 0 if self.tile_water == self.tile_water1 else 1
+            screen.blit(self.water_frames[frame], self.water_rect.topleft)
+            if frame != self.water_frame:
+                self.water_frame = frame
+                changed.append(self.water_rect)
+
+        if self.TILE_GRASS in tiles and self.grass_rect is not None:
+            screen.blit(self.layer_grass, self.grass_rect.topleft, self.grass_rect)
+
+        return changed
+
+    def tileBounds(self, tile):
+        """ Smallest rect containing all tiles of specified type
+		@return pygame.Rect or None if there are no such tiles
+		"""
+        rows, cols = np.nonzero(self.grid == tile)
+        if len(rows) == 0:
+            return None
+        return pygame.Rect(
+            int(cols.min()) * self.TILE_SIZE, int(rows.min()) * self.TILE_SIZE,
+            int(cols.max() - cols.min() + 1) * self.TILE_SIZE, int(rows.max() - rows.min() + 1) * self.TILE_SIZE
+        )
+
+    def __getstate__(self):
+        """ Pickle the map only, pre-rendered layers and cached rects are rebuilt on demand """
+        state = self.__dict__.copy()
+        state.update(_mapr=None, _obstacle_rects=None, layer_ground=None, layer_grass=None, water_frames=None, dirty_tiles=[])
+        return state
+
+    def initLayers(self):
+        """ Render whole map into layer surfaces
+		Ground layer holds brick, steel and ice, grass layer is drawn on top of tanks. Water is a
+		separate pair of small surfaces (one per animation frame) covering only the water area
+		"""
+        size = self.MAP_SIZE * self.TILE_SIZE
+        self.layer_ground = pygame.Surface((size, size))
+        self.layer_grass = pygame.Surface((size, size), pygame.SRCALPHA)
+        self.layer_grass.fill((0, 0, 0, 0))
+        self.grass_rect = self.tileBounds(self.TILE_GRASS)
+        self.dirty_tiles = []
+
+        for row, col in zip(*np.nonzero(self.grid)):
+            self.renderTile(row, col)
+
+        self.initWater()
+
+    def initWater(self):
+        """ Render water animation frames """
+        self.water_rect = self.tileBounds(self.TILE_WATER)
+        if self.water_rect is None:
+            self.water_frames = None
+            return
+
+        self.water_frames = []
+        for image in (self.tile_water1, self.tile_water2):
+            frame = pygame.Surface(self.water_rect.size, pygame.SRCALPHA)
+            frame.fill((0, 0, 0, 0))
+            for row, col in zip(*np.nonzero(self.grid == self.TILE_WATER)):
+                frame.blit(image, (col * self.TILE_SIZE - self.water_rect.left, row * self.TILE_SIZE - self.water_rect.top))
+            self.water_frames.append(frame)
+
+    def renderTile(self, row, col):
+        """ Render single cell into ground or grass layer """
+        rect = pygame.Rect(col * self.TILE_SIZE, row * self.TILE_SIZE, self.TILE_SIZE, self.TILE_SIZE)
+        tile = self.grid[row, col]
+        if tile == self.TILE_BRICK:
+            self.layer_ground.blit(self.tile_brick, rect)
+        elif tile == self.TILE_STEEL:
+            self.layer_ground.blit(self.tile_steel, rect)
+        elif tile == self.TILE_FROZE:
+            self.layer_ground.blit(self.tile_froze, rect)
+        elif tile == self.TILE_GRASS:
+            self.layer_grass.blit(self.tile_grass, rect)
+
+    def redrawTiles(self):
+        """ Re-render cells changed since last draw
+		@return list Rects of re-rendered cells
+		"""
+        water_changed = False
+        rects = []
+        for row, col, old_tile in self.dirty_tiles:
+            rect = pygame.Rect(col * self.TILE_SIZE, row * self.TILE_SIZE, self.TILE_SIZE, self.TILE_SIZE)
+            rects.append(rect)
+            self.layer_ground.fill((0, 0, 0), rect)
+            self.layer_grass.fill((0, 0, 0, 0), rect)
+            self.renderTile(row, col)
+            if old_tile == self.TILE_WATER or self.grid[row, col] == self.TILE_WATER:
+                water_changed = True
+            if self.grid[row, col] == self.TILE_GRASS:
+                self.grass_rect = self.tileBounds(self.TILE_GRASS)
+        self.dirty_tiles = []
 
-        self.obstacle_rects = [self.globals.castle.rect]
+        if water_changed:
+            self.initWater()
 
-        for tile in self.mapr:
-            # if tile.type in (self.TILE_BRICK, self.TILE_STEEL, self.TILE_WATER):
-            if tile.type in (self.TILE_BRICK, self.TILE_STEEL):
-                self.obstacle_rects.append(tile)
+        return rects
+
+    def updateObstacleRects(self):
+        """ Rebuild obstacle map from tile grid """
+
+        # obstacles = np.isin(self.grid, (self.TILE_BRICK, self.TILE_STEEL, self.TILE_WATER))
+        obstacles = np.isin(self.grid, (self.TILE_BRICK, self.TILE_STEEL))
+        weights = 1 << np.arange(self.MAP_SIZE, dtype=np.int64)
+        self.obstacle_rows = [int(bits) for bits in (obstacles * weights).sum(axis=1)]
+        self._mapr = None
+        self._obstacle_rects = None
 
     def buildFortress(self, tile):
         """ Build walls around castle made from tile """
@@ -162,15 +435,5 @@ class Level():
             (13 * self.TILE_SIZE, 23 * self.TILE_SIZE)
         ]
 
-        obsolete = []
-
-        for i, rect in enumerate(self.mapr):
-            if rect.topleft in positions:
-                obsolete.append(rect)
-        for rect in obsolete:
-            self.mapr.remove(rect)
-
         for pos in positions:
-            self.mapr.append(myRect(pos[0], pos[1], self.TILE_SIZE, self.TILE_SIZE, tile))
-
-        self.updateObstacleRects()
+            self.setTile(pos[1] // self.TILE_SIZE, pos[0] // self.TILE_SIZE, tile)
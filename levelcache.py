@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+from level import Level
+
+
+class LevelCache():
+    """ Levels as loaded, which new stages copy instead of loading them again
+
+    Template of a level is parsed once, gets its flow field and, unless rendering is off,
+    its pre-rendered layers. Starting a stage then only copies the tile grid, flow field
+    and layers. Templates are never played on. The least recently used one is dropped
+    once there are more than max_size of them, and all are dropped when level pack changes.
+    """
+
+    def __init__(self, globals, render=True, max_size=8):
+        self.globals = globals
+        self.render = render
+        self.max_size = max_size
+
+        # level number => template, oldest first
+        self.templates = OrderedDict()
+
+        # level pack templates were loaded from
+        self.level_pack = globals.level_pack
+
+        self.hits = 0
+        self.misses = 0
+
+    def level(self, level_nr, globals=None, grid=None):
+        """ New level to play on
+		@param int level_nr Stage number, see Level
+		@param Globals globals Globals of game the level is for, if cache is shared by several games
+		@param numpy.ndarray grid Array for level's tile types, see Level
+		@return Level
+		"""
+        return Level(level_nr, globals or self.globals, self.template(level_nr), grid)
+
+    def template(self, stage):
+        """ Template of level played at stage, loaded on first use
+		Stages playing the same level, e.g. 1 and 36, share its template
+		@param int stage Stage number, see Level
+		@return Level
+		"""
+        if self.level_pack is not self.globals.level_pack:
+            self.clear()
+            self.level_pack = self.globals.level_pack
+
+        level_nr = Level.levelNumber(stage, self.level_pack)
+        template = self.templates.get(level_nr)
+        if template is not None:
+            self.templates.move_to_end(level_nr)
+            self.hits += 1
+            return template
+
+        self.misses += 1
+        template = Level(stage, self.globals)
+        # templates do not animate
+        self.globals.timer.destroy(template.timer_uuid_waves)
+        if self.render:
+            template.initLayers()
+
+        self.templates[level_nr] = template
+        if len(self.templates) > self.max_size:
+            self.templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        self.templates.clear()
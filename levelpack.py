@@ -0,0 +1,120 @@
+""" Many levels packed into one memory-mapped file
+
+Pack starts with a header and a sorted index of level numbers, followed by a
+fixed-size array of tile types for every level in index order. Opening a pack
+reads only the header, a level's tiles are found by binary search in the index
+and read straight from the mapped file, so packs of thousands of levels cost
+neither parsing nor memory up front. Build a pack from a directory of level
+text files with:
+
+    python levelpack.py levels levels.pack
+"""
+
+import argparse
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from level import Level
+
+
+class LevelPack():
+
+    MAGIC = b"BCLP"
+    VERSION = 1
+
+    # magic, version, map width/height in tiles, number of levels
+    HEADER = struct.Struct("<4sHHI")
+
+    # type of index entries (level numbers)
+    NUMBER = np.dtype("<u4")
+
+    def __init__(self, filename):
+        self.file = open(filename, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.size, self.count = self.HEADER.unpack_from(self.data, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError("%s is not a level pack or has unsupported version" % filename)
+        if self.size != Level.MAP_SIZE or self.count == 0:
+            self.close()
+            raise ValueError("%s has no levels of %dx%d tiles" % (filename, Level.MAP_SIZE, Level.MAP_SIZE))
+
+        # sorted level numbers, tiles of n-th of them start at tiles_offset + n * size * size
+        self.numbers = np.frombuffer(self.data, self.NUMBER, self.count, self.HEADER.size)
+        self.tiles_offset = self.HEADER.size + self.count * self.NUMBER.itemsize
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, number):
+        return self.index(number) != -1
+
+    def index(self, number):
+        """ Position of level in pack
+		@return int -1 if pack does not contain level
+		"""
+        n = int(np.searchsorted(self.numbers, number))
+        if n < self.count and self.numbers[n] == number:
+            return n
+        return -1
+
+    def tiles(self, number):
+        """ Tile types of level, read-only view into mapped file
+		@param int number Level number
+		@return numpy.ndarray Array of shape (size, size) or None if pack does not contain level
+		"""
+        n = self.index(number)
+        if n == -1:
+            return None
+        area = self.size * self.size
+        return np.frombuffer(self.data, np.uint8, area, self.tiles_offset + n * area).reshape(self.size, self.size)
+
+    def close(self):
+        self.numbers = None
+        self.data.close()
+        self.file.close()
+
+    @staticmethod
+    def write(filename, levels, size=Level.MAP_SIZE):
+        """ Create pack file
+		@param string filename
+		@param dict levels Level number => tile types array of shape (size, size)
+		@return None
+		"""
+        numbers = sorted(levels)
+        with open(filename, "wb") as f:
+            f.write(LevelPack.HEADER.pack(LevelPack.MAGIC, LevelPack.VERSION, size, len(numbers)))
+            f.write(np.array(numbers, dtype=LevelPack.NUMBER).tobytes())
+            for number in numbers:
+                f.write(np.ascontiguousarray(levels[number], dtype=np.uint8).tobytes())
+
+    @staticmethod
+    def readDirectory(directory):
+        """ Parse level text files named by level numbers
+		@return dict Level number => tile types array
+		"""
+        levels = {}
+        for name in os.listdir(directory):
+            if name.isdigit():
+                with open(os.path.join(directory, name), "r") as f:
+                    levels[int(name)] = Level.parseLevel(f.read())
+        return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack level text files into one level pack")
+    parser.add_argument("directory", help="directory with level files named 1, 2, ...")
+    parser.add_argument("pack", help="level pack to create")
+    args = parser.parse_args(argv)
+
+    levels = LevelPack.readDirectory(args.directory)
+    LevelPack.write(args.pack, levels)
+    print("Packed %d levels into %s" % (len(levels), args.pack))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+import sys
+import time
+
 from castle import Castle
 from game import Game
 from globals import Globals
+from levelpack import LevelPack
+from netplay import NetPlay
+from profiler import FrameProfiler
+from replay import Replay
 from timer import Timer
 from tricks import Tricks
 
@@ -19,8 +26,77 @@ if __name__ == "__main__":
     play_sounds = True
     sounds = {}
 
+    # simulate all stages w/o window and sounds, as fast as possible
+    headless = "--headless" in sys.argv[1:]
+
+    # time main loop phases, F3 shows them on screen
+    profile = "--profile" in sys.argv[1:]
+
+    # --record DIR saves replay of every played stage to DIR,
+    # --replay FILE plays saved stage as fast as possible
+    record_dir = None
+    replay_file = None
+
+    # --levels FILE loads levels from level pack instead of levels directory
+    levels_file = None
+
+    # --host PORT waits for the other player of network game, --connect HOST:PORT joins one,
+    # --delay N sets host's input delay in ticks
+    host_port = None
+    connect_to = None
+    delay = 3
+    for n, arg in enumerate(sys.argv[1:-1], 1):
+        if arg == "--levels":
+            levels_file = sys.argv[n + 1]
+        elif arg == "--record":
+            record_dir = sys.argv[n + 1]
+        elif arg == "--replay":
+            replay_file = sys.argv[n + 1]
+        elif arg == "--host":
+            host_port = int(sys.argv[n + 1])
+        elif arg == "--connect":
+            address, port = sys.argv[n + 1].rsplit(":", 1)
+            connect_to = (address, int(port))
+        elif arg == "--delay":
+            delay = int(sys.argv[n + 1])
+
     globals = Globals(tricks, gtimer, sprites, screen, players, enemies, bullets, bonuses, labels, None, play_sounds, sounds)
-    game = Game(globals)
-    castle = Castle(gtimer, globals.screen, globals.sprites, tricks)
+    if levels_file is not None:
+        globals.level_pack = LevelPack(levels_file)
+    game = Game(globals, headless)
+    castle = Castle(gtimer, globals.screen, globals.atlas, tricks)
     globals.castle = castle
-    game.showMenu()
+    if profile:
+        game.profiler = FrameProfiler()
+    game.record_dir = record_dir
+    if host_port is not None:
+        print("Waiting for the other player on port %d" % host_port)
+        game.netplay = NetPlay.host(host_port, delay=delay)
+    elif connect_to is not None:
+        game.netplay = NetPlay.connect(*connect_to)
+    if game.netplay is not None:
+        game.nr_of_players = 2
+    if replay_file is not None:
+        replay = Replay.load(replay_file)
+        started = time.time()
+        ticks = replay.play(game, not headless)
+        print("Stage %d: %d ticks in %.2f s, score %s" % (
+            replay.stage, ticks, time.time() - started, [player.score for player in globals.players]
+        ))
+    elif headless:
+        stages = 35 if globals.level_pack is None else len(globals.level_pack)
+        for stage in range(1, stages + 1):
+            started = time.time()
+            # give up after 10 minutes of game time
+            ticks = game.simulate(stage, 30000)
+            print("Stage %d: %d ticks in %.2f s" % (stage, ticks, time.time() - started))
+            if profile:
+                for phase, (mean, peak) in game.profiler.summary().items():
+                    print("  %-8s mean %.3f ms, max %.3f ms" % (phase, mean, peak))
+    elif game.netplay is not None:
+        # both sides start right away, menu is skipped
+        del players[:]
+        game.stage = 0
+        game.nextLevel()
+    else:
+        game.showMenu()
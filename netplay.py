@@ -0,0 +1,261 @@
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+from stats import deriveSeed
+
+
+class DesyncError(Exception):
+    """ Simulations of the two sides no longer match """
+
+
+class NetPlay():
+    """ Two-player game over TCP, each side running the whole simulation
+
+    Sides send each other only their player's input for every tick, so both simulate
+    the same ticks with the same inputs and the same random seeds, and stay identical
+    without sending any game state. Input read now is used `delay` ticks later, which
+    gives it time to reach the other side before it is needed; tick is not simulated
+    until the other side's input for it has arrived. Every CHECK_INTERVAL ticks both
+    sides send a checksum of their world and raise DesyncError if they differ.
+
+    Host controls player 1 and picks seed and input delay, the other side connects
+    and controls player 2. Both play with player 1 keys.
+    """
+
+    MAGIC = b"BCNP"
+    VERSION = 1
+
+    # magic, version, session seed, input delay in ticks
+    HELLO = struct.Struct("<4sBIB")
+
+    # message types
+    (MSG_INPUT, MSG_CHECKSUM) = range(2)
+
+    # type, tick, input bit mask
+    INPUT = struct.Struct("<BIH")
+
+    # type, tick, checksum of world before tick
+    CHECKSUM = struct.Struct("<BII")
+
+    # ticks between checksums
+    CHECK_INTERVAL = 50
+
+    # seconds close() waits for the other side to close too
+    CLOSE_TIMEOUT = 5
+
+    def __init__(self, sock, player, seed, delay):
+        """
+		@param socket.socket sock Connected socket
+		@param int player Index of local player, 0 for host, 1 for the other side
+		@param int seed Session seed, stage seeds are derived from it
+		@param int delay Input delay in ticks
+		"""
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.player = player
+        self.seed = seed
+        self.delay = delay
+
+        # ticks simulated so far, over all stages
+        self.tick = 0
+
+        # tick => input bit mask of local and remote player
+        self.local = {}
+        self.remote = {}
+
+        # tick => checksum of this and other side, kept until both are known
+        self.checksums = {}
+        self.remote_checksums = {}
+
+        # received bytes not parsed yet
+        self.buffer = b""
+
+        # first ticks are played before any input could arrive
+        for tick in range(delay):
+            self.local[tick] = 0
+            self.remote[tick] = 0
+
+        self.bytes_sent = 0
+
+    @staticmethod
+    def host(port, seed=None, delay=3, address=""):
+        """ Wait for the other side to connect
+		@param int port
+		@param int seed Session seed, None - random
+		@param int delay Input delay in ticks
+		@return NetPlay
+		"""
+        if seed is None:
+            seed = random.getrandbits(32)
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((address, port))
+        server.listen(1)
+        sock = server.accept()[0]
+        server.close()
+        sock.sendall(NetPlay.HELLO.pack(NetPlay.MAGIC, NetPlay.VERSION, seed, delay))
+        return NetPlay(sock, 0, seed, delay)
+
+    @staticmethod
+    def connect(address, port):
+        """ Join game hosted at address
+		@return NetPlay
+		"""
+        sock = socket.create_connection((address, port))
+        data = b""
+        while len(data) < NetPlay.HELLO.size:
+            chunk = sock.recv(NetPlay.HELLO.size - len(data))
+            if not chunk:
+                raise ConnectionError("host closed connection")
+            data += chunk
+        magic, version, seed, delay = NetPlay.HELLO.unpack(data)
+        if magic != NetPlay.MAGIC or version != NetPlay.VERSION:
+            raise ConnectionError("host speaks a different protocol")
+        return NetPlay(sock, 1, seed, delay)
+
+    def stageSeed(self, stage):
+        """ Random seed of stage, the same on both sides
+		@return int
+		"""
+        return deriveSeed(self.seed, stage) & 0xffffffff
+
+    def exchange(self, game, inputs):
+        """ Trade local input for inputs of both players for the next tick
+		Blocks until the other side's input for the tick arrives
+		@param Game game
+		@param list inputs Inputs read locally, the first one is used as local player's
+		@return list Inputs bit mask of both players
+		"""
+        tick = self.tick
+        local = inputs[0] if inputs else 0
+        self.local[tick + self.delay] = local
+        self.send(self.INPUT.pack(self.MSG_INPUT, tick + self.delay, local))
+
+        if tick % self.CHECK_INTERVAL == 0:
+            checksum = game.checksum()
+            self.checksums[tick] = checksum
+            self.send(self.CHECKSUM.pack(self.MSG_CHECKSUM, tick, checksum))
+            self.compareChecksums()
+
+        while tick not in self.remote:
+            self.receive()
+
+        self.tick += 1
+        local, remote = self.local.pop(tick), self.remote.pop(tick)
+        return [local, remote] if self.player == 0 else [remote, local]
+
+    def compareChecksums(self):
+        for tick in [tick for tick in self.checksums if tick in self.remote_checksums]:
+            if self.checksums.pop(tick) != self.remote_checksums.pop(tick):
+                raise DesyncError("simulations differ at tick %d" % tick)
+
+    def send(self, data):
+        self.sock.sendall(data)
+        self.bytes_sent += len(data)
+
+    def receive(self):
+        """ Wait for data from the other side and parse all complete messages in it """
+        data = self.sock.recv(4096)
+        if not data:
+            raise ConnectionError("other side closed connection")
+        buffer = self.buffer + data
+        offset = 0
+        while offset < len(buffer):
+            kind = buffer[offset]
+            if kind == self.MSG_INPUT:
+                message = self.INPUT
+            elif kind == self.MSG_CHECKSUM:
+                message = self.CHECKSUM
+            else:
+                raise ConnectionError("unknown message type %d" % kind)
+            if len(buffer) - offset < message.size:
+                break
+            kind, tick, value = message.unpack_from(buffer, offset)
+            offset += message.size
+            if kind == self.MSG_INPUT:
+                self.remote[tick] = value
+            else:
+                self.remote_checksums[tick] = value
+        self.buffer = buffer[offset:]
+        self.compareChecksums()
+
+    def close(self):
+        """ Stop sending, then close connection once the other side has closed it too
+		Other side may be a few ticks behind and still sending inputs for them, closing right
+		away would reset the connection under it
+		@return None
+		"""
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+            self.sock.settimeout(self.CLOSE_TIMEOUT)
+            while self.sock.recv(4096):
+                pass
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def check(stages=2, max_ticks=1500):
+    """ Self-test: two sides on localhost play seeded stages with random inputs
+	Each side picks its own inputs, simulations must agree on checksums all the way
+	@return None
+	"""
+    import contextlib
+
+    from environment import Environment
+
+    # free port to host on
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    results = [None, None]
+
+    def play(player):
+        env = Environment(players=2)
+        game = env.game
+        rng = random.Random(player)
+        game.readInputs = lambda: [rng.choice(Environment.ACTIONS)]
+        if player == 0:
+            game.netplay = NetPlay.host(port, seed=1234, address="127.0.0.1")
+        else:
+            # host may not be listening yet
+            deadline = time.time() + 10
+            while game.netplay is None:
+                try:
+                    game.netplay = NetPlay.connect("127.0.0.1", port)
+                except ConnectionRefusedError:
+                    if time.time() > deadline:
+                        raise
+                    time.sleep(0.05)
+        game.nr_of_players = 2
+        checksums = []
+        for stage in range(1, stages + 1):
+            game.simulate(stage, max_ticks)
+            checksums.append(game.checksum())
+        results[player] = (checksums, game.netplay.tick, game.netplay.bytes_sent)
+        game.netplay.close()
+        env.close()
+
+    # stdout is shared by both sides, game over messages of both go away at once
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # daemon, so that host waiting for a client which failed does not keep process alive
+        host = threading.Thread(target=play, args=(0,), daemon=True)
+        host.start()
+        play(1)
+        host.join()
+
+    assert results[0] is not None, "host failed"
+    (host_checksums, ticks, sent), (client_checksums, client_ticks, client_sent) = results
+    assert host_checksums == client_checksums, "sides ended stages differently"
+    assert ticks == client_ticks
+    print("netplay ok: %d ticks, checksums %s, %.1f bytes sent per tick" % (ticks, host_checksums, sent / float(ticks)))
+
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,141 @@
+import numpy as np
+
+from level import Level
+
+
+class ObservationRenderer():
+    """ World as a stack of NumPy layers, one per kind of thing, for bots
+
+    Layer n marks cells covered by things of kind n with 1. Cells are cell_size pixels
+    wide, 16 gives one cell per tile, smaller sizes split tiles, larger ones merge them
+    (a merged cell is marked if any part of it is). Tile layers are rebuilt only when
+    level map changes, everything else is stamped from rects every call. Nothing here
+    touches pygame surfaces. Tile layers of many games with stacked grids can be built
+    together, see stackTileLayers().
+    """
+
+    # layers, in order
+    (BRICK, STEEL, WATER, GRASS, ICE, CASTLE, PLAYERS,
+     ENEMY0, ENEMY1, ENEMY2, ENEMY3, PLAYER_BULLETS, ENEMY_BULLETS, BONUSES) = range(14)
+    LAYERS = (
+        "brick", "steel", "water", "grass", "ice", "castle", "players",
+        "enemy0", "enemy1", "enemy2", "enemy3", "player_bullets", "enemy_bullets", "bonuses"
+    )
+
+    # tile type of each tile layer
+    TILES = (
+        (BRICK, Level.TILE_BRICK), (STEEL, Level.TILE_STEEL), (WATER, Level.TILE_WATER),
+        (GRASS, Level.TILE_GRASS), (ICE, Level.TILE_FROZE)
+    )
+
+    def __init__(self, cell_size=Level.TILE_SIZE, dtype=np.uint8):
+        """
+		@param int cell_size Pixels per cell, must divide tile size or be a multiple of it
+			that divides the battlefield
+		@param dtype Type of returned arrays
+		"""
+        tile = Level.TILE_SIZE
+        size = Level.MAP_SIZE * tile
+        if not (tile % cell_size == 0 or (cell_size % tile == 0 and size % cell_size == 0)):
+            raise ValueError("cell size %d does not fit %d px tiles" % (cell_size, tile))
+
+        self.cell_size = cell_size
+        self.dtype = dtype
+        self.cells = size // cell_size
+        self.shape = (len(self.LAYERS), self.cells, self.cells)
+
+        # level and its map tile layers were last built from
+        self.level = None
+        self.grid = None
+        self.tiles = np.zeros((len(self.TILES), self.cells, self.cells), dtype=dtype)
+
+        # stacked grids and their tile layers, see stackTileLayers()
+        self.stack_grids = None
+        self.stack_tiles = None
+
+    def tileLayers(self, level):
+        """ Layers of tile types, rebuilt only if map changed
+		@return numpy.ndarray
+		"""
+        if level is self.level and np.array_equal(level.grid, self.grid):
+            return self.tiles
+
+        self.level = level
+        self.grid = level.grid.copy()
+        self.tiles[:] = self.buildTileLayers(self.grid[np.newaxis])[0]
+        return self.tiles
+
+    def stackTileLayers(self, grids):
+        """ Layers of tile types of many games, rebuilt only for grids that changed
+		@param numpy.ndarray grids Tile grids of shape (games, rows, columns)
+		@return numpy.ndarray Array of shape (games, tile layers, cells, cells)
+		"""
+        if self.stack_grids is None or self.stack_grids.shape != grids.shape:
+            self.stack_grids = grids.copy()
+            self.stack_tiles = self.buildTileLayers(grids)
+            return self.stack_tiles
+
+        changed = np.flatnonzero((grids != self.stack_grids).any(axis=(1, 2)))
+        if len(changed):
+            self.stack_grids[changed] = grids[changed]
+            self.stack_tiles[changed] = self.buildTileLayers(grids[changed])
+        return self.stack_tiles
+
+    def buildTileLayers(self, grids):
+        """ Tile layers of every grid
+		@param numpy.ndarray grids Tile grids of shape (games, rows, columns)
+		@return numpy.ndarray Array of shape (games, tile layers, cells, cells)
+		"""
+        tiles = np.array([tile for layer, tile in self.TILES], dtype=grids.dtype)
+        cells = grids[:, np.newaxis] == tiles[:, np.newaxis, np.newaxis]
+        if self.cell_size < Level.TILE_SIZE:
+            factor = Level.TILE_SIZE // self.cell_size
+            cells = cells.repeat(factor, axis=2).repeat(factor, axis=3)
+        elif self.cell_size > Level.TILE_SIZE:
+            factor = self.cell_size // Level.TILE_SIZE
+            cells = cells.reshape(len(grids), len(tiles), self.cells, factor, self.cells, factor).any(axis=(3, 5))
+        return cells.astype(self.dtype)
+
+    def render(self, game, out=None):
+        """ Layers of current state of game
+		@param Game game
+		@param numpy.ndarray out Array of shape self.shape to write into instead of a new one
+		@return numpy.ndarray Array of shape (layers, cells, cells)
+		"""
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        out[:len(self.TILES)] = self.tileLayers(game.level)
+        return self.renderObjects(game, out)
+
+    def renderObjects(self, game, out):
+        """ Fill layers of everything but tiles
+		@param Game game
+		@param numpy.ndarray out Array of shape self.shape, tile layers are left as they are
+		@return numpy.ndarray out
+		"""
+        out[len(self.TILES):] = 0
+
+        globals = game.globals
+        if globals.castle.active:
+            self.stamp(out[self.CASTLE], globals.castle.rect)
+        for player in globals.players:
+            if player.state == player.STATE_ALIVE:
+                self.stamp(out[self.PLAYERS], player.rect)
+        for enemy in globals.enemies:
+            if enemy.state == enemy.STATE_ALIVE:
+                self.stamp(out[self.ENEMY0 + enemy.type], enemy.rect)
+        for bullet in globals.bullets:
+            if bullet.state == bullet.STATE_ACTIVE:
+                layer = self.PLAYER_BULLETS if bullet.owner == bullet.OWNER_PLAYER else self.ENEMY_BULLETS
+                self.stamp(out[layer], bullet.rect)
+        for bonus in globals.bonuses:
+            if bonus.active:
+                self.stamp(out[self.BONUSES], bonus.rect)
+        return out
+
+    def stamp(self, layer, rect):
+        """ Mark cells rect overlaps with """
+        size = self.cell_size
+        left = rect.left if rect.left > 0 else 0
+        top = rect.top if rect.top > 0 else 0
+        layer[top // size:(rect.bottom - 1) // size + 1, left // size:(rect.right - 1) // size + 1] = 1
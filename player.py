@@ -7,9 +7,9 @@ class Player(Tank):
 
 	def __init__(self, level, type, position = None, direction = None, filename = None, globals=None):
 		if globals.tricks is not None:
-			Tank.__init__(self, level, type, position = None, direction = None, filename = None, globals=globals, super_power=globals.tricks.player_bullet_super_power, speed_in=globals.tricks.player_bullet_speed)
+			Tank.__init__(self, level, type, position = None, direction = direction, filename = None, globals=globals, super_power=globals.tricks.player_bullet_super_power, speed_in=globals.tricks.player_bullet_speed)
 		else:
-			Tank.__init__(self, level, type, position=None, direction=None, filename=None, globals=globals)
+			Tank.__init__(self, level, type, position=None, direction=direction, filename=None, globals=globals)
 
 		self.globals = globals
 
@@ -36,11 +36,12 @@ class Player(Tank):
 			"enemy3" : 0
 		}
 
-		self.image = self.globals.sprites.subsurface(filename)
-		self.image_up = self.image;
-		self.image_left = pygame.transform.rotate(self.image, 90)
-		self.image_down = pygame.transform.rotate(self.image, 180)
-		self.image_right = pygame.transform.rotate(self.image, 270)
+		images = self.globals.atlas.rotations(filename)
+		self.image = images[self.DIR_UP]
+		self.image_up = images[self.DIR_UP]
+		self.image_left = images[self.DIR_LEFT]
+		self.image_down = images[self.DIR_DOWN]
+		self.image_right = images[self.DIR_RIGHT]
 
 		if direction == None:
 			self.rotate(self.DIR_UP, False)
@@ -53,6 +54,7 @@ class Player(Tank):
 		if self.state == self.STATE_EXPLODING:
 			if not self.explosion.active:
 				self.state = self.STATE_DEAD
+				self.globals.explosion_pool.release(self.explosion)
 				del self.explosion
 
 		if self.state != self.STATE_ALIVE:
@@ -86,31 +88,35 @@ class Player(Tank):
 		player_rect = pygame.Rect(new_position, [26, 26])
 
 		# collisions with tiles
-		if player_rect.collidelist(self.level.obstacle_rects) != -1:
+		if self.level.collideObstacles(player_rect):
 			return
 
+		tanks = self.globals.spatial_tanks.query(player_rect)
+
 		# collisions with other players
-		for player in self.globals.players:
-			if player != self and player.state == player.STATE_ALIVE and player_rect.colliderect(player.rect) == True:
+		for player in tanks:
+			if player.side == self.SIDE_PLAYER and player != self and player.state == player.STATE_ALIVE and player_rect.colliderect(player.rect) == True:
 				return
 
 		# collisions with enemies
-		for enemy in self.globals.enemies:
-			if player_rect.colliderect(enemy.rect) == True:
+		for enemy in tanks:
+			if enemy.side == self.SIDE_ENEMY and player_rect.colliderect(enemy.rect) == True:
 				return
 
 		# collisions with bonuses
-		for bonus in self.globals.bonuses:
+		for bonus in self.globals.spatial_bonuses.query(player_rect):
 			if player_rect.colliderect(bonus.rect) == True:
 				self.bonus = bonus
 
 		#if no collision, move player
 		self.rect.topleft = (new_position[0], new_position[1])
+		self.globals.spatial_tanks.update(self)
 
 	def reset(self):
 		""" reset player """
 		self.rotate(self.start_direction, False)
 		self.rect.topleft = self.start_position
+		self.globals.spatial_tanks.update(self)
 		if self.globals.tricks is not None:
 			self.superpowers = self.globals.tricks.player_bullet_super_power
 		else:
@@ -0,0 +1,40 @@
+class Pool():
+    """ Free list of released objects of one class
+
+    acquire() hands out a released object after calling its reset() with the given
+    arguments, or creates a new one when nothing is free. Objects must not be used
+    after they have been released.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+
+        # acquire() calls served from free list / by creating a new object
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, *args, **kwargs):
+        """ Get object initialized with args
+		@return object Instance of pool's class
+		"""
+        if self.free:
+            self.hits += 1
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            return obj
+        self.misses += 1
+        return self.cls(*args, **kwargs)
+
+    def release(self, obj):
+        """ Return object to pool
+		@param object obj Object acquired from this pool
+		@return None
+		"""
+        self.free.append(obj)
+
+    def stats(self):
+        """ Pool usage since creation
+		@return dict hits, misses and number of free objects
+		"""
+        return {"hits": self.hits, "misses": self.misses, "free": len(self.free)}
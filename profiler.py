@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+
+
+class FrameProfiler():
+    """ Time spent in each phase of recent frames
+
+    Game calls begin() when frame starts and mark() after each phase, which charges the
+    time since previous mark to that phase. end() stores the frame together with entity
+    counts in a ring buffer of the last `size` frames. Game holds None instead of a
+    profiler when profiling is off, so disabled profiling costs only a few None checks.
+    """
+
+    # phases in the order they happen in a frame
+    (EVENTS, PLAYERS, ENEMIES, BULLETS, TIMERS, DRAW) = range(6)
+    PHASES = ("events", "players", "enemies", "bullets", "timers", "draw")
+
+    # entity counts stored with each frame
+    COUNTS = ("enemies", "bullets", "bonuses")
+
+    def __init__(self, size=300):
+        self.size = size
+
+        # seconds per phase, one row per frame
+        self.times = np.zeros((size, len(self.PHASES)))
+        self.counts = np.zeros((size, len(self.COUNTS)), dtype=np.int32)
+
+        # number of frames recorded so far, next row is frames % size
+        self.frames = 0
+
+        # phase times of frame in progress
+        self.current = [0.0] * len(self.PHASES)
+        self.last = time.perf_counter()
+
+        # whether game should draw overlay
+        self.overlay = False
+
+    def begin(self):
+        """ Start new frame """
+        self.current = [0.0] * len(self.PHASES)
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        """ Charge time since previous mark to phase
+		@param int phase One of EVENTS ... DRAW
+		@return None
+		"""
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end(self, counts):
+        """ Store finished frame
+		@param tuple counts Entity counts, see COUNTS
+		@return None
+		"""
+        row = self.frames % self.size
+        self.times[row] = self.current
+        self.counts[row] = counts
+        self.frames += 1
+
+    def recent(self):
+        """ Rows of recorded frames, oldest first
+		@return tuple Times (in seconds) and entity counts
+		"""
+        if self.frames < self.size:
+            return self.times[:self.frames], self.counts[:self.frames]
+        order = np.roll(np.arange(self.size), -(self.frames % self.size))
+        return self.times[order], self.counts[order]
+
+    def summary(self):
+        """ Mean and max milliseconds of every phase and of whole frame over buffered frames
+		@return dict Phase => (mean, max)
+		"""
+        times, counts = self.recent()
+        if len(times) == 0:
+            return {}
+        result = {}
+        for n, phase in enumerate(self.PHASES):
+            result[phase] = (times[:, n].mean() * 1000, times[:, n].max() * 1000)
+        total = times.sum(axis=1)
+        result["frame"] = (total.mean() * 1000, total.max() * 1000)
+        return result
+
+    def draw(self, screen, text, font, position=(4, 4)):
+        """ Draw per-phase times of recent frames and latest entity counts
+		@param pygame.Surface screen
+		@param TextCache text
+		@param pygame.font.Font font
+		@return pygame.Rect Screen area drawn to or None
+		"""
+        summary = self.summary()
+        if not summary:
+            return None
+        lines = ["%-8s %6.2f %6.2f" % (phase, mean, peak) for phase, (mean, peak) in summary.items()]
+        row = (self.frames - 1) % self.size
+        lines.append(" ".join("%s %d" % (name, count) for name, count in zip(self.COUNTS, self.counts[row])))
+
+        area = None
+        x, y = position
+        for line in lines:
+            rect = screen.blit(text.render(font, line, False, (255, 255, 0)), (x, y))
+            area = rect if area is None else area.union(rect)
+            y += rect.height
+        return area
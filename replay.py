@@ -0,0 +1,225 @@
+import struct
+
+from tricks import Tricks
+
+
+class Replay():
+    """ Everything needed to play a stage again exactly as it was played
+
+    Stage, random seed, players' lives and scores at the start, whether tricks were on,
+    and inputs of every tick. Inputs are stored run-length encoded: consecutive ticks
+    with the same inputs take a few bytes in total, so a whole stage is usually a few
+    kilobytes at most.
+    """
+
+    MAGIC = b"BCRP"
+    VERSION = 1
+
+    # magic, version, stage, seed, number of players, tricks on
+    HEADER = struct.Struct("<4sBHQBB")
+
+    # lives, score
+    PLAYER = struct.Struct("<HI")
+
+    # number of ticks
+    TICKS = struct.Struct("<I")
+
+    def __init__(self, stage, seed, players, tricks=False):
+        """
+		@param int stage Stage number
+		@param int seed Seed given to Game.startLevel
+		@param list players (lives, score) of every player when stage started
+		@param boolean tricks Whether tricks were on when stage started
+		"""
+        self.stage = stage
+        self.seed = seed
+        self.players = [tuple(player) for player in players]
+        self.tricks = tricks
+
+        # Inputs bit masks of every player, one tuple per tick
+        self.inputs = []
+
+    @staticmethod
+    def fromGame(game, seed):
+        """ Start recording stage game has just started with seed
+		@return Replay
+		"""
+        return Replay(
+            game.stage, seed, [(player.lives, player.score) for player in game.globals.players],
+            game.globals.tricks is not None
+        )
+
+    def record(self, inputs):
+        """ Add inputs of one tick
+		@param list inputs Inputs bit mask for every player
+		@return None
+		"""
+        self.inputs.append(tuple(inputs))
+
+    def encode(self):
+        """ Serialize replay
+		@return bytes
+		"""
+        parts = [
+            self.HEADER.pack(self.MAGIC, self.VERSION, self.stage, self.seed, len(self.players), self.tricks)
+        ]
+        for lives, score in self.players:
+            parts.append(self.PLAYER.pack(lives, score))
+        parts.append(self.TICKS.pack(len(self.inputs)))
+
+        tick = struct.Struct("<%dH" % len(self.players))
+        previous = None
+        run = 0
+        for inputs in self.inputs + [None]:
+            if inputs == previous:
+                run += 1
+                continue
+            if previous is not None:
+                parts.append(self.encodeVarint(run))
+                parts.append(tick.pack(*previous))
+            previous = inputs
+            run = 1
+        return b"".join(parts)
+
+    @staticmethod
+    def decode(data):
+        """ Deserialize replay made by encode()
+		@param bytes data
+		@return Replay
+		"""
+        magic, version, stage, seed, players, tricks = Replay.HEADER.unpack_from(data, 0)
+        if magic != Replay.MAGIC or version != Replay.VERSION:
+            raise ValueError("not a replay or unsupported version")
+        offset = Replay.HEADER.size
+
+        player_states = []
+        for n in range(players):
+            player_states.append(Replay.PLAYER.unpack_from(data, offset))
+            offset += Replay.PLAYER.size
+
+        replay = Replay(stage, seed, player_states, bool(tricks))
+        ticks, = Replay.TICKS.unpack_from(data, offset)
+        offset += Replay.TICKS.size
+
+        tick = struct.Struct("<%dH" % players)
+        while len(replay.inputs) < ticks:
+            run, offset = Replay.decodeVarint(data, offset)
+            inputs = tick.unpack_from(data, offset)
+            offset += tick.size
+            replay.inputs.extend([inputs] * run)
+        return replay
+
+    @staticmethod
+    def encodeVarint(value):
+        """ 7 bits per byte, high bit set on all but last byte
+		@return bytes
+		"""
+        out = bytearray()
+        while value > 0x7f:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+        return bytes(out)
+
+    @staticmethod
+    def decodeVarint(data, offset):
+        """
+		@return tuple Value and offset after it
+		"""
+        value = 0
+        shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value, offset
+            shift += 7
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            f.write(self.encode())
+
+    @staticmethod
+    def load(filename):
+        """
+		@return Replay
+		"""
+        with open(filename, "rb") as f:
+            return Replay.decode(f.read())
+
+    def play(self, game, render=False):
+        """ Play recorded stage as fast as possible
+		@param Game game
+		@param boolean render Draw every tick
+		@return int Number of played ticks
+		"""
+        globals = game.globals
+        if self.tricks and globals.tricks is None:
+            globals.tricks = Tricks()
+        elif not self.tricks:
+            globals.tricks = None
+        globals.castle.tricks = globals.tricks
+
+        del globals.players[:]
+        game.nr_of_players = len(self.players)
+        game.stage = self.stage - 1
+        game.startLevel(self.seed)
+        for player, (lives, score) in zip(globals.players, self.players):
+            player.lives = lives
+            player.score = score
+
+        if render:
+            game.draw()
+        for inputs in self.inputs:
+            game.step(list(inputs))
+            if render:
+                game.draw()
+        return game.ticks
+
+
+def check(stages=(1, 4), ticks=2000):
+    """ Self-test: record seeded headless stages with random inputs, play them back from
+	encoded bytes in a fresh game and compare world checksums. Second stage is played with
+	tricks on
+	@return None
+	"""
+    import contextlib
+    import random
+
+    from environment import Environment
+
+    for n, stage in enumerate(stages):
+        seed = 1000 + stage
+        env = Environment(players=2)
+        game = env.game
+        if n % 2 == 1:
+            game.toggleTricks()
+        rng = random.Random(seed)
+        inputs = [0, 0]
+        with contextlib.redirect_stdout(env.devnull):
+            game.nr_of_players = 2
+            game.stage = stage - 1
+            game.startLevel(seed)
+            replay = Replay.fromGame(game, seed)
+            while game.running and game.ticks < ticks:
+                # hold inputs for a while, as players do
+                if rng.random() < 0.05:
+                    inputs = [rng.choice(Environment.ACTIONS) for player in range(2)]
+                replay.record(inputs)
+                game.step(inputs)
+        recorded = game.checksum()
+        env.close()
+
+        data = replay.encode()
+        env = Environment(players=2)
+        with contextlib.redirect_stdout(env.devnull):
+            played = Replay.decode(data).play(env.game)
+        assert played == len(replay.inputs), "replay played %d of %d ticks" % (played, len(replay.inputs))
+        assert env.game.checksum() == recorded, "replay of stage %d diverged" % stage
+        env.close()
+        print("replay ok: stage %d, %d ticks in %d bytes, tricks %s" % (stage, played, len(data), replay.tricks))
+
+
+if __name__ == "__main__":
+    check()
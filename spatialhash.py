@@ -0,0 +1,95 @@
+class SpatialHash():
+    """ Uniform grid of buckets used to find objects near a rect without checking all of them
+
+    Every stored object must have a pygame.Rect in its rect attribute. Object is kept in
+    every cell its rect overlaps, so update() has to be called each time it moves.
+    Buckets are insertion ordered dicts, which keeps query results deterministic.
+    """
+
+    # cell key is row * ROW_KEY + column
+    ROW_KEY = 1 << 16
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+
+        # cell key => {object: None}
+        self.cells = {}
+
+        # object => tuple of keys of cells it is in
+        self.objects = {}
+
+    def cellsOf(self, rect):
+        """ Keys of all cells rect overlaps with
+		@return tuple
+		"""
+        size = self.cell_size
+        col0 = rect.left // size
+        col1 = (rect.right - 1) // size
+        row0 = rect.top // size * self.ROW_KEY
+        row1 = (rect.bottom - 1) // size * self.ROW_KEY
+        if row0 == row1:
+            if col0 == col1:
+                return (row0 + col0,)
+            elif col1 == col0 + 1:
+                return (row0 + col0, row0 + col1)
+        elif row1 == row0 + self.ROW_KEY and col0 == col1:
+            return (row0 + col0, row1 + col0)
+        return tuple(row + col for row in range(row0, row1 + 1, self.ROW_KEY) for col in range(col0, col1 + 1))
+
+    def insert(self, obj):
+        """ Start tracking object """
+        if obj in self.objects:
+            self.update(obj)
+        else:
+            self.place(obj, self.cellsOf(obj.rect))
+
+    def place(self, obj, keys):
+        """ Put untracked object into specified cells """
+        self.objects[obj] = keys
+        for key in keys:
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = {obj: None}
+            else:
+                cell[obj] = None
+
+    def remove(self, obj):
+        """ Stop tracking object. Does nothing if object isn't tracked """
+        keys = self.objects.pop(obj, None)
+        if keys is None:
+            return
+        for key in keys:
+            cell = self.cells[key]
+            del cell[obj]
+            if not cell:
+                del self.cells[key]
+
+    def update(self, obj):
+        """ Move object to the cells its rect currently overlaps with """
+        keys = self.objects.get(obj)
+        if keys is None:
+            return
+        new_keys = self.cellsOf(obj.rect)
+        if new_keys != keys:
+            self.remove(obj)
+            self.place(obj, new_keys)
+
+    def query(self, rect):
+        """ Objects that might collide with rect. Caller still has to check actual collision
+		@return list
+		"""
+        keys = self.cellsOf(rect)
+        if len(keys) == 1:
+            cell = self.cells.get(keys[0])
+            return list(cell) if cell else []
+        found = {}
+        for key in keys:
+            cell = self.cells.get(key)
+            if cell:
+                found.update(cell)
+        return list(found)
+
+    def clear(self):
+        """ Forget all objects """
+        self.cells.clear()
+        self.objects.clear()
@@ -0,0 +1,27 @@
+""" Helpers shared by scripts that play many seeded stages and summarize them """
+
+import hashlib
+import math
+import struct
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of sorted list
+	@return float
+	"""
+    if not values:
+        return 0.0
+    rank = max(int(math.ceil(p / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def deriveSeed(seed, *parts):
+    """ Seed of one part of a seeded whole, e.g. of a run and stage of it
+	Seed and parts are hashed together, so seeds of different parts do not overlap or
+	follow each other, and the same seed and parts always give the same seed
+	@param int seed Seed of the whole
+	@param int parts Numbers identifying the part
+	@return int 64-bit seed
+	"""
+    data = struct.pack("<%dq" % (len(parts) + 1), seed, *parts)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
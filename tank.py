@@ -1,11 +1,5 @@
-import random
-
 import pygame
 
-from bullet import Bullet
-from explosion import Explosion
-from label import Label
-
 
 class Tank():
     # possible directions
@@ -71,17 +65,11 @@ class Tank():
         # currently pressed buttons (navigation only)
         self.pressed = [False] * 4
 
-        self.shield_images = [
-            globals.sprites.subsurface(0, 48 * 2, 16 * 2, 16 * 2),
-            globals.sprites.subsurface(16 * 2, 48 * 2, 16 * 2, 16 * 2)
-        ]
+        self.shield_images = globals.atlas.shield
         self.shield_image = self.shield_images[0]
         self.shield_index = 0
 
-        self.spawn_images = [
-            globals.sprites.subsurface(32 * 2, 48 * 2, 16 * 2, 16 * 2),
-            globals.sprites.subsurface(48 * 2, 48 * 2, 16 * 2, 16 * 2)
-        ]
+        self.spawn_images = globals.atlas.spawn
         self.spawn_image = self.spawn_images[0]
         self.spawn_index = 0
 
@@ -93,17 +81,17 @@ class Tank():
             self.rect = pygame.Rect(0, 0, 26, 26)
 
         if direction == None:
-            self.direction = random.choice([self.DIR_RIGHT, self.DIR_DOWN, self.DIR_LEFT])
+            self.direction = self.globals.rng.choice([self.DIR_RIGHT, self.DIR_DOWN, self.DIR_LEFT])
         else:
             self.direction = direction
 
         self.state = self.STATE_SPAWNING
 
         # spawning animation
-        self.timer_uuid_spawn = self.timer.add(100, lambda: self.toggleSpawnImage())
+        self.timer_uuid_spawn = self.timer.add(100, self.toggleSpawnImage)
 
         # duration of spawning
-        self.timer_uuid_spawn_end = self.timer.add(1000, lambda: self.endSpawning())
+        self.timer_uuid_spawn_end = self.timer.add(1000, self.endSpawning)
 
     def endSpawning(self):
         """ End spawning
@@ -134,27 +122,31 @@ class Tank():
             self.shield_image = self.shield_images[self.shield_index]
 
     def draw(self):
-        """ draw tank """
+        """ draw tank
+		@return pygame.Rect Screen area drawn to or None
+		"""
         if self.state == self.STATE_ALIVE:
-            self.globals.screen.blit(self.image, self.rect.topleft)
+            area = self.globals.screen.blit(self.image, self.rect.topleft)
             if self.shielded:
-                self.globals.screen.blit(self.shield_image, [self.rect.left - 3, self.rect.top - 3])
+                area = area.union(self.globals.screen.blit(self.shield_image, [self.rect.left - 3, self.rect.top - 3]))
+            return area
         elif self.state == self.STATE_EXPLODING:
-            self.explosion.draw()
+            return self.explosion.draw()
         elif self.state == self.STATE_SPAWNING:
-            self.globals.screen.blit(self.spawn_image, self.rect.topleft)
+            return self.globals.screen.blit(self.spawn_image, self.rect.topleft)
 
     def explode(self):
         """ start tanks's explosion """
         if self.state != self.STATE_DEAD:
             self.state = self.STATE_EXPLODING
-            self.explosion = Explosion(self.rect.topleft, self.timer, self.globals.screen, self.globals.sprites)
+            self.explosion = self.globals.explosion_pool.acquire(self.rect.topleft, self.timer, self.globals.screen,
+                                                                 self.globals.sprites, images=self.globals.atlas.explosion)
 
             if self.bonus:
                 self.spawnBonus()
     def gen_bullet(self, direction):
 
-        bullet = Bullet(self.level, self.rect.topleft, direction, globals=self.globals)
+        bullet = self.globals.bullet_pool.acquire(self.level, self.rect.topleft, direction, globals=self.globals)
 
         # if superpower level is at least 1
         if self.superpowers > 0:
@@ -172,6 +164,7 @@ class Tank():
 
         bullet.owner_class = self
         self.globals.bullets.append(bullet)
+        self.globals.spatial_bullets.insert(bullet)
 
     def fire(self, forced=False, allow_full_fire=False, all_direction=False):
         """ Shoot a bullet
@@ -230,6 +223,8 @@ class Tank():
             if (abs(self.rect.top - new_y) < 5):
                 self.rect.top = new_y
 
+            self.globals.spatial_tanks.update(self)
+
     def turnAround(self):
         """ Turn tank into opposite direction """
         if self.direction in (self.DIR_UP, self.DIR_RIGHT):
@@ -242,6 +237,7 @@ class Tank():
         if self.state == self.STATE_EXPLODING:
             if not self.explosion.active:
                 self.state = self.STATE_DEAD
+                self.globals.explosion_pool.release(self.explosion)
                 del self.explosion
 
     def nearest(self, num, base):
@@ -266,7 +262,7 @@ class Tank():
                     if self.globals.play_sounds:
                         self.globals.sounds["explosion"].play()
 
-                    self.globals.labels.append(Label(self.rect.topleft, str(points), 500, globals=self.globals))
+                    self.globals.labels.append(self.globals.label_pool.acquire(self.rect.topleft, str(points), 500, globals=self.globals))
 
                 self.explode()
             return True
@@ -276,7 +272,7 @@ class Tank():
         elif self.side == self.SIDE_PLAYER:
             # if not self.paralised:
             # 	self.setParalised(True)
-            # 	self.timer_uuid_paralise = self.timer.add(1000, lambda :self.setParalised(False), 1)
+            # 	self.timer_uuid_paralise = self.timer.add(1000, self.setParalised, 1, (False,))
             return True
 
     def setParalised(self, paralised=True):
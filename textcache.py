@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache():
+    """ Rendered text surfaces and loaded fonts, shared by everything that draws text
+
+    Surfaces are keyed by font, string, antialias flag and color and the least recently used
+    one is dropped once there are more than max_size of them. Returned surfaces are shared
+    and must never be drawn onto.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+
+        # (font, text, antialias, color) => surface, oldest first
+        self.surfaces = OrderedDict()
+
+        # (name, size, system) => pygame.font.Font
+        self.fonts = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, name, size, system=False):
+        """ Load font once
+		@param string name Font file, or font name when system is True
+		@param int size
+		@param boolean system Look font up with pygame.font.SysFont
+		@return pygame.font.Font
+		"""
+        key = (name, size, system)
+        font = self.fonts.get(key)
+        if font is None:
+            if system:
+                font = pygame.font.SysFont(name, size)
+            else:
+                font = pygame.font.Font(name, size)
+            self.fonts[key] = font
+        return font
+
+    def render(self, font, text, antialias, color):
+        """ Same as font.render, but reuses previously rendered surfaces
+		@param pygame.font.Font font
+		@param string text
+		@param boolean antialias
+		@param color Anything pygame.Color accepts
+		@return pygame.Surface
+		"""
+        key = (font, text, antialias, tuple(pygame.Color(color)))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """ Drop all rendered surfaces, fonts are kept """
+        self.surfaces.clear()
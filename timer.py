@@ -1,41 +1,95 @@
-import uuid
+import heapq
 
 
 class Timer(object):
+	""" Priority queue of scheduled callbacks
+
+	Timers are kept in a heap ordered by due time and creation order, so update()
+	only looks at timers that are actually due. add() returns an integer handle
+	which destroy() uses to cancel the timer in constant time.
+	"""
+
+	# positions in a heap entry
+	(DUE, HANDLE, INTERVAL, CALLBACK, ARGS, REPEAT) = range(6)
+
 	def __init__(self):
-		self.timers = []
-
-	def add(self, interval, f, repeat = -1):
-		options = {
-			"interval"	: interval,
-			"callback"	: f,
-			"repeat"		: repeat,
-			"times"			: 0,
-			"time"			: 0,
-			"uuid"			: uuid.uuid4()
-		}
-		self.timers.append(options)
-
-		return options["uuid"]
-
-	def destroy(self, uuid_nr):
-		for timer in self.timers:
-			if timer["uuid"] == uuid_nr:
-				self.timers.remove(timer)
-				return
+
+		# heap of [due, handle, interval, callback, args, repeat] lists
+		self.queue = []
+
+		# live heap entries by handle
+		self.timers = {}
+
+		# total time passed since creation
+		self.time = 0
+
+		# number of destroyed entries still sitting in the heap
+		self.cancelled = 0
+
+		# handle of next added timer, plain int so timer state can be pickled
+		self.next_handle = 1
+
+	def add(self, interval, f, repeat = -1, args = ()):
+		""" Schedule callback
+		@param int interval Milliseconds between calls
+		@param callable f Callback
+		@param int repeat Number of calls, -1 means until destroyed
+		@param tuple args Positional arguments for callback
+		@return int Handle for destroy()
+		"""
+		handle = self.next_handle
+		self.next_handle += 1
+		entry = [self.time + interval, handle, interval, f, args, repeat]
+		self.timers[handle] = entry
+		heapq.heappush(self.queue, entry)
+		return handle
+
+	def destroy(self, handle):
+		""" Cancel timer, unknown or finished handles are ignored
+		@param int handle Value returned by add()
+		@return None
+		"""
+		entry = self.timers.pop(handle, None)
+		if entry is None:
+			return
+		entry[self.CALLBACK] = None
+		self.cancelled += 1
+
+		# drop dead entries once they make up most of the heap
+		if self.cancelled > 64 and self.cancelled * 2 > len(self.queue):
+			self.queue[:] = [e for e in self.queue if e[self.CALLBACK] is not None]
+			heapq.heapify(self.queue)
+			self.cancelled = 0
+
+	def clear(self):
+		""" Cancel all timers """
+		del self.queue[:]
+		self.timers.clear()
+		self.cancelled = 0
 
 	def update(self, time_passed):
-		for timer in self.timers:
-			timer["time"] += time_passed
-			if timer["time"] > timer["interval"]:
-				timer["time"] -= timer["interval"]
-				timer["times"] += 1
-				if timer["repeat"] > -1 and timer["times"] == timer["repeat"]:
-					self.timers.remove(timer)
-				try:
-					timer["callback"]()
-				except:
-					try:
-						self.timers.remove(timer)
-					except:
-						pass
+		""" Advance time and call every timer that became due
+		A repeating timer is called once for each interval elapsed, so a long
+		time_passed catches up instead of dropping calls. Callbacks may add or
+		destroy timers, and their exceptions are not swallowed.
+		@param int time_passed Milliseconds
+		@return None
+		"""
+		self.time += time_passed
+		queue = self.queue
+		while queue and queue[0][self.DUE] < self.time:
+			entry = heapq.heappop(queue)
+			f = entry[self.CALLBACK]
+			if f is None:
+				self.cancelled -= 1
+				continue
+
+			if entry[self.REPEAT] > -1:
+				entry[self.REPEAT] -= 1
+			if entry[self.REPEAT] == 0:
+				del self.timers[entry[self.HANDLE]]
+			else:
+				entry[self.DUE] += entry[self.INTERVAL]
+				heapq.heappush(queue, entry)
+
+			f(*entry[self.ARGS])
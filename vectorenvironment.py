@@ -0,0 +1,197 @@
+import contextlib
+import random
+
+import numpy as np
+
+from bulletsystem import BulletSystem
+from environment import Environment
+from level import Level
+from observation import ObservationRenderer
+
+
+class VectorEnvironment():
+    """ Many independent environments stepped together in one process
+
+    step() takes actions of every environment and returns observations, rewards and done
+    flags stacked into NumPy arrays with environments along the first axis. Environment
+    whose episode ended is reset right away to the next stage of `stages` with a fresh
+    seed; its last observation and info are put into its info dict as "final_observation"
+    and "final_info". All environments share images, fonts, screen and level cache, so
+    each one costs little more than its world state.
+
+    World state that suits arrays is laid out across environments: tile grids of all of
+    them are stacked in one (count, rows, columns) array, which their levels keep their
+    tiles in, and their bullets live in one BulletSystem tagged with environment index.
+    Every tick the rest of each game is played up to moving bullets, then bullets of all
+    environments are moved and checked against stacked grids at once, then each game
+    resolves its collisions and finishes the tick. Observations are built from the stacked
+    grids in one go as well.
+
+    Enemy decisions are still made by every game on its own, they draw from the game's
+    random generator in an order that batching would change. A single environment may
+    still be stepped by itself (Environment.step()); it then moves only its own bullets,
+    but checks them against its map without batching. Since bullets are not kept per
+    game, Snapshot cannot save a single environment.
+
+    Running this module checks that environments stepped together give the same results
+    as the same environments stepped alone.
+    """
+
+    def __init__(self, count, players=1, frame_skip=1, max_ticks=None, lives=None, stages=(1,), seed=None, cell_size=None):
+        """
+		@param int count Number of environments
+		@param tuple stages Stages episodes cycle through
+		@param int seed Seed of generator picking episode seeds, None - random
+		Other arguments are passed to every Environment
+		"""
+        first = Environment(players, frame_skip, max_ticks, lives, cell_size=cell_size)
+        self.envs = [first] + [
+            Environment(players, frame_skip, max_ticks, lives, shared=first, cell_size=cell_size) for n in range(count - 1)
+        ]
+        self.count = count
+        self.players = players
+        self.frame_skip = frame_skip
+        self.stages = tuple(stages)
+        self.rng = random.Random(seed)
+
+        # number of episodes started so far, picks stage of the next one
+        self.episodes = 0
+
+        # tile grid of every environment, levels keep their tiles here
+        self.grids = np.zeros((count, Level.MAP_SIZE, Level.MAP_SIZE), dtype=np.uint8)
+
+        # bullets of all environments
+        self.bullet_system = BulletSystem()
+
+        for n, env in enumerate(self.envs):
+            env.globals.bullet_system = self.bullet_system
+            env.globals.env_index = n
+            env.game.grid = self.grids[n]
+
+        self.renderer = None if cell_size is None else ObservationRenderer(cell_size)
+
+        # environments still playing ticks of current step
+        self.running = np.zeros(count, dtype=bool)
+
+        self.observations = np.zeros((count,) + first.observation_shape, dtype=np.uint8)
+        self.rewards = np.zeros((count, players), dtype=np.float32)
+        self.terminated = np.zeros(count, dtype=bool)
+        self.truncated = np.zeros(count, dtype=bool)
+
+    def reset(self):
+        """ Start new episode in every environment
+		@return tuple Observations and list of info dicts
+		"""
+        infos = [self.resetEnv(n) for n in range(self.count)]
+        self.observe()
+        return self.observations.copy(), infos
+
+    def resetEnv(self, n):
+        """ Start next episode in n-th environment
+		@return dict Info returned by its reset()
+		"""
+        stage = self.stages[self.episodes % len(self.stages)]
+        self.episodes += 1
+        return self.envs[n].reset(stage, self.rng.getrandbits(32))[1]
+
+    def step(self, actions):
+        """ Step every environment
+		@param actions Array-like of shape (count, players) or (count,) with indices into
+			Environment.ACTIONS
+		@return tuple Observations, rewards of shape (count, players), terminated and truncated
+			flags of shape (count,) and list of info dicts
+		"""
+        actions = np.asarray(actions).reshape(self.count, self.players)
+        envs = self.envs
+        for n, env in enumerate(envs):
+            env.applyActions(actions[n])
+
+        running = self.running
+        running[:] = True
+        with contextlib.redirect_stdout(envs[0].devnull):
+            for tick in range(self.frame_skip):
+                playing = [env for env, run in zip(envs, running.tolist()) if run]
+                for env in playing:
+                    env.game.beginStep(env.inputs)
+                self.bullet_system.step(self.grids, running)
+                for env in playing:
+                    env.game.endStep()
+                    if env.checkOutcome():
+                        running[env.globals.env_index] = False
+                if not running.any():
+                    break
+
+        infos = []
+        for n, env in enumerate(envs):
+            rewards, terminated, truncated, info = env.collectRewards()
+            self.rewards[n] = rewards
+            self.terminated[n] = terminated
+            self.truncated[n] = truncated
+            if terminated or truncated:
+                info = {"final_observation": env.observe(), "final_info": info}
+                info["reset"] = self.resetEnv(n)
+            infos.append(info)
+
+        self.observe()
+        return self.observations.copy(), self.rewards.copy(), self.terminated.copy(), self.truncated.copy(), infos
+
+    def observe(self):
+        """ Fill observations of all environments, tiles of all of them at once
+		@return None
+		"""
+        observations = self.observations
+        if self.renderer is not None:
+            tile_layers = len(ObservationRenderer.TILES)
+            observations[:, :tile_layers] = self.renderer.stackTileLayers(self.grids)
+            for n, env in enumerate(self.envs):
+                self.renderer.renderObjects(env.game, observations[n])
+        else:
+            observations[:] = self.grids
+            for n, env in enumerate(self.envs):
+                env.stampObjects(observations[n])
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def check(count=6, steps=600):
+    """ Self-test: vector environment must match standalone environments step for step,
+	including episodes reset in the middle, for tile maps and observation layers
+	@return None
+	"""
+    for players, frame_skip, cell_size in ((1, 4, None), (2, 2, 8)):
+        vector = VectorEnvironment(
+            count, players, frame_skip, max_ticks=1500, lives=2, stages=(1, 4, 7), seed=3, cell_size=cell_size
+        )
+        observations, infos = vector.reset()
+        envs = [Environment(players, frame_skip, 1500, 2, cell_size=cell_size) for n in range(count)]
+        for env, info in zip(envs, infos):
+            env.reset(info["stage"], info["seed"])
+
+        rng = np.random.default_rng(players)
+        resets = 0
+        for step in range(steps):
+            actions = rng.integers(0, len(Environment.ACTIONS), size=(count, players))
+            observations, rewards, terminated, truncated, infos = vector.step(actions)
+            for n, env in enumerate(envs):
+                observation, reward, done, cut, info = env.step(list(actions[n]))
+                assert (rewards[n] == reward).all() and terminated[n] == done and truncated[n] == cut, \
+                    "environment %d differs at step %d" % (n, step)
+                if done or cut:
+                    assert (infos[n]["final_observation"] == observation).all() and infos[n]["final_info"] == info
+                    reset = infos[n]["reset"]
+                    observation = env.reset(reset["stage"], reset["seed"])[0]
+                    resets += 1
+                assert (observations[n] == observation).all(), "observation %d differs at step %d" % (n, step)
+
+        for env in envs:
+            env.close()
+        vector.close()
+        print("vector environment ok: %d players, frame skip %d, cell size %s, %d resets" % (
+            players, frame_skip, cell_size, resets
+        ))
+
+
+if __name__ == "__main__":
+    check()